@@ -0,0 +1,39 @@
+"""
+Compares serial and concurrent fetch_reddit_data latency against a local fake Reddit client.
+
+Usage: python -m benchmarks.bench_fetch_reddit [--latency 0.2] [--workers 8]
+"""
+import argparse
+import time
+from modules.reddit_data import fetch_reddit_data
+from benchmarks.fakes import FakeReddit
+
+
+def run(n_subreddits: int, max_workers: int, latency: float, jitter: float) -> float:
+    subreddits = [f"sub{i}" for i in range(n_subreddits)]
+    start = time.perf_counter()
+    result = fetch_reddit_data(
+        subreddits, limit=30, max_workers=max_workers, timeout=10,
+        reddit_factory=lambda: FakeReddit(latency=latency, jitter=jitter),
+    )
+    elapsed = time.perf_counter() - start
+    assert len(result) == n_subreddits
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per listing request")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Extra random seconds per request")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrency cap for the concurrent run")
+    args = parser.parse_args()
+
+    print(f"{'subreddits':>10} {'serial (s)':>12} {'concurrent (s)':>15} {'speedup':>8}")
+    for n in (10, 20, 30, 40, 50):
+        serial = run(n, 1, args.latency, args.jitter)
+        concurrent = run(n, args.workers, args.latency, args.jitter)
+        print(f"{n:>10} {serial:>12.2f} {concurrent:>15.2f} {serial / concurrent:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compares keyword refinement modes: the LLM call, local RAKE extraction over the whole corpus, and the
+hybrid of both. Reports latency per mode and how much each mode's keywords overlap the LLM's.
+
+By default the LLM is a local mock whose answer is the reference keyword list planted in a synthetic
+corpus, with --llm-latency seconds of delay. With --secrets the real API is used and its keywords
+become the reference. --corpus takes a JSON file of {subreddit: [posts]} instead of the synthetic corpus.
+
+Usage: python -m benchmarks.bench_keywords [--posts 2000] [--llm-latency 1.5] [--secrets secrets.toml]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from modules import config, data_processing, hook_generator, llm_client, llm_cache
+from modules.defaults import DEFAULT_PRODUCT_INFO
+from benchmarks.fakes import FakeOpenAIServer
+
+REFERENCE_KEYWORDS = [
+    "intermittent fasting", "weight loss", "meal timing", "fasting window", "electrolytes",
+    "progress tracking", "metabolic health", "autophagy", "calorie deficit", "hunger cravings",
+]
+FILLER = [
+    "honestly I did not expect this", "anyone else notice", "after a few weeks", "my doctor said",
+    "it was hard at first", "so I tried", "what worked for me", "the first days were rough",
+]
+
+
+def synthetic_corpus(n_posts: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    posts = []
+    for _ in range(n_posts):
+        sentences = []
+        for _ in range(rng.randint(2, 6)):
+            topic = rng.choice(REFERENCE_KEYWORDS)
+            ending = rng.choice(["is what helped", "has changed", "was the hard part"])
+            sentences.append(f"{rng.choice(FILLER)}, {topic} {ending}.")
+        posts.append(" ".join(sentences))
+    return posts
+
+
+def overlap(keywords: list, reference: list) -> tuple:
+    """
+    Returns (word-level Jaccard similarity, share of reference phrases found verbatim).
+    """
+    words = {w for kw in keywords for w in kw.lower().split()}
+    reference_words = {w for kw in reference for w in kw.lower().split()}
+    union = words | reference_words
+    jaccard = len(words & reference_words) / len(union) if union else 0.0
+    lowered = {kw.lower() for kw in keywords}
+    recall = sum(kw.lower() in lowered for kw in reference) / len(reference) if reference else 0.0
+    return jaccard, recall
+
+
+def run_mode(mode: str, posts: list, repeats: int) -> tuple:
+    aggregated = " ".join(posts)
+    timings, keywords = [], []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        keywords = hook_generator.generate_refined_keywords(
+            DEFAULT_PRODUCT_INFO, aggregated, bypass_cache=True, mode=mode, documents=iter(posts)
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, keywords
+
+
+def report(posts: list, repeats: int) -> None:
+    results = {mode: run_mode(mode, posts, repeats) for mode in ("llm", "local", "hybrid")}
+    reference = results["llm"][1]
+    print(f"{len(posts)} posts, {sum(len(p) for p in posts) / 1e6:.2f} MB of text")
+    print(f"{'mode':>8} {'p50 (ms)':>10} {'max (ms)':>10} {'jaccard':>8} {'recall':>8}  keywords")
+    for mode, (timings, keywords) in results.items():
+        jaccard, recall = overlap(keywords, reference)
+        print(f"{mode:>8} {statistics.median(timings):>10.1f} {max(timings):>10.1f} {jaccard:>8.2f} "
+              f"{recall:>8.2f}  {', '.join(keywords[:6])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=2000, help="Synthetic corpus size")
+    parser.add_argument("--corpus", help="JSON file of {subreddit: [posts]}")
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="Mock LLM latency in seconds")
+    parser.add_argument("--secrets", help="TOML file with an [openai] section; benchmarks the real API")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            posts = [post for subreddit_posts in json.load(f).values() for post in subreddit_posts]
+    else:
+        posts = synthetic_corpus(args.posts)
+    llm_cache._default_cache = llm_cache.LLMCache(path=":memory:")
+    data_processing.get_stopwords()
+
+    if args.secrets:
+        config.load_file(args.secrets)
+        report(posts, args.repeats)
+        return
+    with FakeOpenAIServer(latency=args.llm_latency, responder=lambda request: ", ".join(REFERENCE_KEYWORDS)) as server:
+        llm_client.configure(OPENAI_API_KEY="sk-local", BASE_URL=server.base_url)
+        report(posts, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Measures per-call overhead of constructing an OpenAI client for every request versus reusing
+the shared llm_client, against a local mock Responses endpoint.
+
+Usage: python -m benchmarks.bench_llm_client [--calls 200]
+"""
+import argparse
+import statistics
+import time
+from openai import OpenAI
+from modules import llm_client
+from benchmarks.fakes import FakeOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "Write three hooks."}]
+
+
+def per_call_client(base_url: str) -> str:
+    client = OpenAI(api_key="sk-local", base_url=base_url)
+    return client.responses.create(model="gpt-4o", input=MESSAGES, temperature=0.7).output_text
+
+
+def shared_client(base_url: str) -> str:
+    return llm_client.get_client().responses.create(model="gpt-4o", input=MESSAGES, temperature=0.7).output_text
+
+
+def measure(func, base_url: str, calls: int) -> list:
+    func(base_url)
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func(base_url)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer() as server:
+        llm_client.configure(OPENAI_API_KEY="sk-local", BASE_URL=server.base_url)
+        print(f"{'mode':>16} {'mean (ms)':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'connections':>12}")
+        for name, func in (("per-call client", per_call_client), ("shared client", shared_client)):
+            connections_before = server.connections
+            timings = measure(func, server.base_url, args.calls)
+            p95 = statistics.quantiles(timings, n=20)[18]
+            print(f"{name:>16} {statistics.mean(timings):>10.2f} {statistics.median(timings):>10.2f} "
+                  f"{p95:>10.2f} {server.connections - connections_before:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Measures the shared preprocessing pass on a synthetic corpus: the analysis stages (content hashing,
+hook-example ranking, local keyword extraction and optionally VADER scoring) fed raw strings, each
+re-processing every post, versus fed PostRecords built once. Also times tools.clean_text and
+tools.normalize_text against their previous multi-pass implementations.
+
+Usage: python -m benchmarks.bench_preprocess [--posts 100000] [--sentiment]
+"""
+import argparse
+import random
+import re
+import time
+import unicodedata
+from modules import data_processing, keyword_extraction, preprocess, tools
+from modules.prompt_generator import HOOK_TEMPLATES
+
+WORDS = (
+    "fasting weight routine morning coffee hunger energy sleep gym progress diet meal window results "
+    "motivation habit craving plateau breakfast protein tracking week month doctor friends"
+).split()
+TYPOGRAPHIC = ["’", "“", "”", "…", "—"]
+
+
+def synthetic_corpus(n_posts: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    fragments = [re.sub(r"\[[^\]]*\]|_{2,}", rng.choice(WORDS), template) for template in HOOK_TEMPLATES]
+    posts = []
+    for _ in range(n_posts):
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20)))
+            if rng.random() < 0.1:
+                words = rng.choice(fragments) + " " + words
+            if rng.random() < 0.2:
+                words += rng.choice(TYPOGRAPHIC)
+            sentences.append(words.capitalize() + rng.choice([".", "!", "?"]))
+        posts.append(" ".join(sentences))
+    return posts
+
+
+def legacy_clean_text(text: str) -> str:
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\W+", " ", text)
+    return text.lower().strip()
+
+
+def legacy_normalize_text(text: str) -> str:
+    replacements = {
+        "…": "...", "’": "'", "‘": "'", "–": "-", "—": "-", "“": '"', "”": '"',
+    }
+    for orig, repl in replacements.items():
+        text = text.replace(orig, repl)
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+
+def timed(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def analyze(posts_by_subreddit: dict, sentiment: bool) -> dict:
+    documents = [post for posts in posts_by_subreddit.values() for post in posts]
+    results = {
+        "hashes": [record.hash if isinstance(record, preprocess.PostRecord) else preprocess.content_hash(record)
+                   for record in documents],
+        "examples": data_processing.rank_hook_examples(posts_by_subreddit, k=3),
+        "keywords": keyword_extraction.extract_keywords(documents, n=20),
+    }
+    if sentiment:
+        results["sentiment"] = data_processing.score_documents(documents).mean(axis=0).tolist()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=100_000)
+    parser.add_argument("--sentiment", action="store_true", help="Include VADER scoring (slow)")
+    args = parser.parse_args()
+
+    posts = synthetic_corpus(args.posts)
+    print(f"{len(posts)} posts, {sum(len(p) for p in posts) / 1e6:.1f} MB of text")
+    data_processing.get_stopwords()
+    data_processing.get_hook_matcher()
+
+    for name, legacy, current in (("clean_text", legacy_clean_text, tools.clean_text),
+                                  ("normalize_text", legacy_normalize_text, tools.normalize_text)):
+        old, old_seconds = timed(lambda: [legacy(post) for post in posts])
+        new, new_seconds = timed(lambda: [current(post) for post in posts])
+        assert old == new, f"{name} output changed"
+        print(f"{name:>16}: {old_seconds:.2f}s -> {new_seconds:.2f}s ({old_seconds / new_seconds:.1f}x)")
+
+    by_subreddit = {f"sub{i}": posts[i::10] for i in range(10)}
+    raw, raw_seconds = timed(analyze, by_subreddit, args.sentiment)
+    records, preprocess_seconds = timed(
+        lambda: {sub: preprocess.preprocess_posts(sub_posts) for sub, sub_posts in by_subreddit.items()}
+    )
+    shared, shared_seconds = timed(analyze, records, args.sentiment)
+    assert raw == shared, "stage results differ between raw posts and PostRecords"
+    print(f"{'raw posts':>16}: {raw_seconds:.2f}s")
+    print(f"{'PostRecords':>16}: {preprocess_seconds:.2f}s preprocessing + {shared_seconds:.2f}s stages "
+          f"= {preprocess_seconds + shared_seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures cold import time of the app modules with `python -X importtime`, so regressions such as
+heavy top-level imports or import-time downloads show up. Exits non-zero when a module exceeds --max-ms.
+
+Usage: python -m benchmarks.bench_startup [--max-ms 500] [--top 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "modules.tools",
+    "modules.prompt_generator",
+    "modules.data_processing",
+    "modules.reddit_data",
+    "modules.hook_generator",
+    "modules.pipeline",
+    "modules.batch",
+]
+
+
+def import_times(module: str) -> tuple:
+    """
+    Imports `module` in a fresh interpreter and returns its cumulative import time in microseconds
+    plus [(cumulative_us, name)] of the imports it pulled in, heaviest first.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative_us), depth, name.strip()))
+    # Children are listed before their parent, one level deeper; interpreter startup imports come first.
+    index = next(i for i, row in enumerate(rows) if row[2] == module and row[1] == 0)
+    children = []
+    for cumulative, depth, name in reversed(rows[:index]):
+        if depth == 0:
+            break
+        children.append((cumulative, name))
+    return rows[index][0], sorted(children, reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-ms", type=float, default=500.0, help="Fail when a module takes longer to import")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest dependencies to list per module")
+    args = parser.parse_args()
+
+    failed = []
+    for module in MODULES:
+        total_us, children = import_times(module)
+        total_ms = total_us / 1000
+        print(f"{module:<28} {total_ms:>8.1f} ms")
+        for cumulative, name in children[:args.top]:
+            print(f"    {name:<40} {cumulative / 1000:>8.1f} ms")
+        if total_ms > args.max_ms:
+            failed.append(module)
+    if failed:
+        print(f"Import time above {args.max_ms} ms: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
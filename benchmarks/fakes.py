@@ -0,0 +1,241 @@
+"""
+Local stand-ins for the external services used by the pipeline, so benchmarks run offline.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Submissions available in each fake listing.
+LISTING_LENGTH = 1000
+
+
+class FakeSubmission:
+    def __init__(self, subreddit: str, index: int):
+        self.id = f"{subreddit}{index}"
+        self.fullname = f"t3_{self.id}"
+        self.title = f"Post {index} in r/{subreddit}: did you know how much this changed my routine?"
+        self.selftext = (
+            "I started a few weeks ago and honestly the results surprised me. "
+            "Here's the truth about sticking with it when motivation runs out."
+        )
+        # Lower indices are newer; "new" listing indices start at 10000.
+        self.created_utc = 1_700_000_000.0 - (index % 10_000) * 60
+        self.stickied = False
+        self.comment_sort = "confidence"
+        self._reddit = None
+        self._comments = None
+
+    @property
+    def comments(self):
+        # Fetched on first access, as PRAW does.
+        if self._comments is None:
+            if self._reddit is not None:
+                self._reddit.simulate_request()
+            self._comments = FakeCommentForest(self.id)
+        return self._comments
+
+
+class FakeComment:
+    def __init__(self, submission_id: str, index: int):
+        self.fullname = f"t1_{submission_id}c{index}"
+        self.body = f"Comment {index}: stop wasting time on plans that never stick, this one finally did."
+
+
+class FakeCommentForest(list):
+    def __init__(self, submission_id: str, n_comments: int = 5):
+        super().__init__(FakeComment(submission_id, i) for i in range(n_comments))
+
+    def replace_more(self, limit: int = 0):
+        return []
+
+
+class FakeSubreddit:
+    def __init__(self, reddit, name: str):
+        self._reddit = reddit
+        self.display_name = name
+
+    def hot(self, limit: int = 30, params: dict = None):
+        # Like Reddit, hot listings start with the subreddit's pinned posts.
+        return self._listing(range(LISTING_LENGTH), limit, params, stickied=2)
+
+    def top(self, time_filter: str = "all", limit: int = 30, params: dict = None):
+        return self._listing(range(0, 2 * LISTING_LENGTH, 2), limit, params)
+
+    def new(self, limit: int = 30, params: dict = None):
+        return self._listing(range(10_000, 10_000 + LISTING_LENGTH), limit, params)
+
+    def _position(self, indices: range, fullname: str):
+        prefix = f"t3_{self.display_name}"
+        suffix = fullname[len(prefix):]
+        if not fullname.startswith(prefix) or not suffix.isdigit() or int(suffix) not in indices:
+            return None
+        return indices.index(int(suffix))
+
+    def _listing(self, indices: range, limit: int, params: dict, stickied: int = 0):
+        # Reddit's cursors: `after` continues past a submission, `before` stops at it (nothing when unknown).
+        params = params or {}
+        if params.get("after"):
+            position = self._position(indices, params["after"])
+            indices = indices[position + 1:] if position is not None else indices[:0]
+            stickied = 0
+        if params.get("before"):
+            position = self._position(indices, params["before"])
+            indices = indices[:position] if position is not None else indices[:0]
+        return self._paged(indices, limit, stickied)
+
+    def _paged(self, indices, limit: int, stickied: int = 0):
+        # Like PRAW, listings are fetched lazily in pages of 100 submissions.
+        for position, index in enumerate(indices[:limit]):
+            if position % 100 == 0:
+                self._reddit.simulate_request()
+            submission = FakeSubmission(self.display_name, index)
+            submission.stickied = position < stickied
+            submission._reddit = self._reddit
+            yield submission
+
+
+class FakeReddit:
+    """
+    Mimics the part of praw.Reddit used by reddit_data: each listing request sleeps for
+    `latency` seconds (plus up to `jitter`) before returning synthetic submissions, and fails
+    with prawcore's RequestException with probability `failure_rate`.
+    """
+
+    def __init__(self, latency: float = 0.2, jitter: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+    def simulate_request(self):
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+        if self.failure_rate and random.random() < self.failure_rate:
+            from prawcore.exceptions import RequestException
+            raise RequestException(ConnectionError("injected failure"), (), {})
+
+    def subreddit(self, name: str):
+        return FakeSubreddit(self, name)
+
+
+def make_response_body(text: str, model: str = "gpt-4o") -> dict:
+    """
+    Builds a minimal Responses API payload whose output_text is `text`.
+    """
+    return {
+        "id": "resp_fake",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": model,
+        "status": "completed",
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "output": [
+            {
+                "type": "message",
+                "id": "msg_fake",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+        ],
+        "usage": {
+            "input_tokens": 100,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": 50,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": 150,
+        },
+    }
+
+
+class FakeOpenAIServer:
+    """
+    Local HTTP/1.1 server answering POST /v1/responses after `latency` seconds (plus up to `jitter`).
+    With probability `failure_rate` a request gets a 500 error instead (counted in `failures`).
+    `responder(request_json)` returns the output text; by default it echoes a fixed list of hooks.
+    Streaming requests get the text as server-sent delta events of `chunk_size` characters,
+    `chunk_delay` seconds apart.
+    Use as a context manager; `base_url` is what to pass to the OpenAI client.
+    """
+
+    def __init__(self, latency: float = 0.0, responder=None, chunk_size: int = 8, chunk_delay: float = 0.0,
+                 jitter: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failures = 0
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.responder = responder or (lambda request: "Hook one\nHook two\nHook three")
+        self.requests = 0
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                server.requests += 1
+                if server.latency or server.jitter:
+                    time.sleep(server.latency + random.uniform(0, server.jitter))
+                if server.failure_rate and random.random() < server.failure_rate:
+                    server.failures += 1
+                    self._send_json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+                    return
+                text = server.responder(request)
+                if request.get("stream"):
+                    self._stream(text, request.get("model", "gpt-4o"))
+                    return
+                self._send_json(200, make_response_body(text, request.get("model", "gpt-4o")))
+
+            def _send_json(self, status, body):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, text, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for i in range(0, len(text), server.chunk_size):
+                    if server.chunk_delay:
+                        time.sleep(server.chunk_delay)
+                    self._event({
+                        "type": "response.output_text.delta", "item_id": "msg_fake", "output_index": 0,
+                        "content_index": 0, "delta": text[i:i + server.chunk_size],
+                    })
+                self._event({"type": "response.completed", "response": make_response_body(text, model)})
+
+            def _event(self, data):
+                self.wfile.write(f"event: {data['type']}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,253 @@
+"""
+Benchmark suite covering the pipeline's hot paths and the full pipeline under concurrent load, run
+against the local fakes (FakeReddit, FakeOpenAIServer) with configurable latency and failure rates.
+Reports p50/p95/p99 latency, throughput and peak traced memory per case. Results can be saved as a
+baseline and later runs compared against it; comparison exits with status 1 on regressions.
+
+Usage: python -m benchmarks.suite [--iterations 20] [--runs 20] [--concurrency 4] [--only NAME ...]
+                                  [--reddit-latency 0.05] [--reddit-failure-rate 0.0]
+                                  [--llm-latency 0.1] [--llm-failure-rate 0.0]
+                                  [--save-baseline [PATH]] [--compare [PATH]] [--threshold 0.2]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from modules import config, data_processing, hook_generator, llm_client, pipeline, prompt_generator, resilience, tools
+from modules.defaults import DEFAULT_BASE_INSTRUCTION, DEFAULT_PRODUCT_INFO
+from modules.reddit_data import fetch_reddit_data
+from benchmarks.bench_preprocess import synthetic_corpus
+from benchmarks.fakes import FakeOpenAIServer, FakeReddit
+
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+POSTS_PER_CALL = 300
+NORMALIZE_PER_CALL = 1000
+N_SUBREDDITS = 10
+# Lower is better for these; throughput is compared the other way round.
+COMPARED = ("p50_ms", "p95_ms", "peak_kb")
+
+KEYWORDS = ["intermittent fasting", "weight loss", "morning routine", "hunger", "energy", "tracking"]
+SENTIMENT = {"neg": 0.08, "neu": 0.78, "pos": 0.14, "compound": 0.31}
+EXAMPLES = [
+    "Why no one talks about the first week of fasting",
+    "The secret to sticking with a morning routine",
+    "I tried tracking every meal for a month and this happened",
+]
+
+
+def responder(request: dict) -> str:
+    text = json.dumps(request)
+    if "subreddit names" in text:
+        return ", ".join(f"sub{i}" for i in range(N_SUBREDDITS))
+    if "copywriter" not in text:
+        return ", ".join(KEYWORDS)
+    return "\n".join(f"Hook {i}: why fasting changed everything for number {i * 7}" for i in range(1, 6))
+
+
+class Case:
+    """
+    One benchmark: prepare(i) builds the input of call i outside the timed region, call(input) is timed.
+    `items` is the number of documents one call processes, for items-per-second throughput.
+    """
+
+    def __init__(self, name: str, prepare, call, items: int = 1, concurrency: int = 1):
+        self.name = name
+        self.prepare = prepare
+        self.call = call
+        self.items = items
+        self.concurrency = concurrency
+
+
+def build_cases(args) -> list:
+    def corpus(i, n=POSTS_PER_CALL):
+        # A fresh corpus per call, so the sentiment score cache never answers for the benchmark.
+        return synthetic_corpus(n, seed=i + 1)
+
+    def by_subreddit(i):
+        posts = corpus(i)
+        return {f"sub{j}": posts[j::N_SUBREDDITS] for j in range(N_SUBREDDITS)}
+
+    def reddit_factory():
+        return FakeReddit(latency=args.reddit_latency, jitter=args.reddit_jitter,
+                          failure_rate=args.reddit_failure_rate)
+
+    def product(i):
+        # A distinct product per run keeps discovery and keyword prompts from hitting the LLM cache.
+        return {**DEFAULT_PRODUCT_INFO, "PRODUCT_NAME": f"{DEFAULT_PRODUCT_INFO['PRODUCT_NAME']} {i}"}
+
+    prompt = prompt_generator.construct_prompt(
+        DEFAULT_PRODUCT_INFO, KEYWORDS, SENTIMENT, EXAMPLES, 5, DEFAULT_BASE_INSTRUCTION
+    )
+    return [
+        Case("normalize_text", lambda i: corpus(i, NORMALIZE_PER_CALL),
+             lambda posts: [tools.normalize_text(post) for post in posts], items=NORMALIZE_PER_CALL),
+        Case("analyze_sentiment", corpus, data_processing.analyze_sentiment, items=POSTS_PER_CALL),
+        Case("extract_hook_examples", by_subreddit, data_processing.extract_hook_examples, items=POSTS_PER_CALL),
+        Case("construct_prompt", lambda i: None, lambda _: prompt_generator.construct_prompt(
+            DEFAULT_PRODUCT_INFO, KEYWORDS, SENTIMENT, EXAMPLES, 5, DEFAULT_BASE_INSTRUCTION
+        )),
+        Case("fetch_reddit_data", lambda i: [f"sub{j}" for j in range(N_SUBREDDITS)],
+             lambda subreddits: fetch_reddit_data(subreddits, limit=30, reddit_factory=reddit_factory),
+             items=N_SUBREDDITS),
+        Case("generate_hook", lambda i: prompt,
+             lambda text: hook_generator.generate_hook(text, bypass_cache=True)),
+        Case("pipeline", product, lambda product_info: pipeline.run_pipeline(
+            product_info, 5, DEFAULT_BASE_INSTRUCTION, n_subreddits=N_SUBREDDITS, reddit_factory=reddit_factory,
+            bypass_cache=True, collect_metrics=False,
+        ), concurrency=args.concurrency),
+    ]
+
+
+def measure(case: Case, iterations: int) -> dict:
+    """
+    Runs one warm-up call, then `iterations` timed calls (`case.concurrency` at a time), then one more
+    call under tracemalloc for the peak memory, kept out of the timings because tracing slows Python down.
+    """
+    inputs = [case.prepare(i) for i in range(iterations + 2)]
+    errors = 0
+
+    def timed(value):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            case.call(value)
+        except Exception as e:
+            errors += 1
+            logging.getLogger(__name__).warning(f"{case.name} failed: {e}")
+        return (time.perf_counter() - start) * 1000
+
+    timed(inputs[-1])
+    errors = 0
+
+    start = time.perf_counter()
+    if case.concurrency > 1:
+        with ThreadPoolExecutor(max_workers=case.concurrency) as executor:
+            latencies = list(executor.map(timed, inputs[:iterations]))
+    else:
+        latencies = [timed(value) for value in inputs[:iterations]]
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        timed(inputs[iterations])
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "iterations": iterations,
+        "concurrency": case.concurrency,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "calls_per_s": round(iterations / elapsed, 3),
+        "items_per_s": round(iterations * case.items / elapsed, 3),
+        "peak_kb": round(peak / 1024, 1),
+        "errors": errors,
+    }
+
+
+def print_results(results: dict) -> None:
+    print(f"{'case':>22} {'p50 (ms)':>10} {'p95 (ms)':>10} {'p99 (ms)':>10} {'calls/s':>9} "
+          f"{'items/s':>10} {'peak (KB)':>10} {'errors':>7}")
+    for name, result in results.items():
+        print(f"{name:>22} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['p99_ms']:>10.2f} "
+              f"{result['calls_per_s']:>9.2f} {result['items_per_s']:>10.1f} {result['peak_kb']:>10.1f} "
+              f"{result['errors']:>7}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Prints each case's change against the baseline and returns the regressions: latency or peak memory
+    up, or throughput down, by more than `threshold` (a fraction).
+    """
+    regressions = []
+    print(f"\n{'case':>22} {'metric':>12} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            print(f"{name:>22} {'(not in baseline)':>12}")
+            continue
+        for metric in COMPARED + ("calls_per_s",):
+            old, new = previous.get(metric), result[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = -change if metric == "calls_per_s" else change
+            flag = " REGRESSION" if worse > threshold else ""
+            if flag:
+                regressions.append((name, metric, old, new))
+            print(f"{name:>22} {metric:>12} {old:>12.2f} {new:>12.2f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20, help="Timed calls per module case")
+    parser.add_argument("--runs", type=int, default=20, help="Pipeline runs in the load case")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent pipeline runs")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="Run only these cases")
+    parser.add_argument("--reddit-latency", type=float, default=0.05, help="Simulated seconds per Reddit request")
+    parser.add_argument("--reddit-jitter", type=float, default=0.02)
+    parser.add_argument("--reddit-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="Simulated seconds per LLM request")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-retries", type=int, default=2, help="OpenAI client MAX_RETRIES")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, metavar="PATH")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    # Keep benchmark completions out of the persistent LLM cache.
+    config.configure("openai", CACHE_PATH=":memory:")
+    data_processing.get_analyzer()
+    data_processing.get_hook_matcher()
+
+    results = {}
+    with FakeOpenAIServer(latency=args.llm_latency, jitter=args.llm_jitter, failure_rate=args.llm_failure_rate,
+                          responder=responder) as server:
+        llm_client.configure(OPENAI_API_KEY="sk-local", BASE_URL=server.base_url, MAX_RETRIES=args.llm_retries)
+        for case in build_cases(args):
+            if args.only and case.name not in args.only:
+                continue
+            results[case.name] = measure(case, args.runs if case.name == "pipeline" else args.iterations)
+        print(f"LLM requests: {server.requests}, injected failures: {server.failures}")
+    for endpoint, counters in resilience.stats().items():
+        print(f"{endpoint}: " + ", ".join(f"{name}={value}" for name, value in counters.items()))
+    print()
+    print_results(results)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    if args.save_baseline:
+        directory = os.path.dirname(args.save_baseline)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        baseline = {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "settings": {key: value for key, value in vars(args).items()
+                         if key not in ("save_baseline", "compare", "only")},
+            "results": results,
+        }
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"\nSaved baseline to {args.save_baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
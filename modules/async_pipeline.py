@@ -0,0 +1,72 @@
+"""
+Async entry point for embedding hook generation in ASGI services:
+
+    run_data = await async_pipeline.generate_hooks(product_info, n_hooks=5)
+
+It runs the same stages as pipeline.run_pipeline (build_pipeline with asynchronous=True) on the event
+loop: network stages use AsyncOpenAI (and asyncpraw when installed), CPU-bound analysis runs in the
+default executor, and every stage is bounded by a timeout. Cancelling the awaiting task cancels
+the stages in flight; work already handed to a worker thread finishes but its result is dropped.
+"""
+import asyncio
+import time
+import weakref
+from . import metrics
+from .defaults import DEFAULT_BASE_INSTRUCTION
+from .pipeline import (
+    build_pipeline, cached_run_data, finish_run, make_recorder, make_run_data, reuse_options, semantic_match
+)
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_STAGE_TIMEOUTS = {
+    "discover": 30.0,
+    "fetch": 60.0,
+    "keywords": 60.0,
+    "sentiment": 30.0,
+    "examples": 30.0,
+    "templates": 10.0,
+    "generate": 120.0,
+}
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _default_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(DEFAULT_CONCURRENCY)
+    return semaphore
+
+
+async def generate_hooks(product_info: dict, n_hooks: int = 3, base_instruction: str = DEFAULT_BASE_INSTRUCTION,
+                         timeouts: dict = None, semaphore: asyncio.Semaphore = None, collect_metrics: bool = None,
+                         run_index=None, **options) -> dict:
+    """
+    Async counterpart of pipeline.run_pipeline, returning the same run_data record. `run_index` and
+    `collect_metrics` work as there, and options are passed to build_pipeline (fetch_mode, on_hook,
+    hooks_per_call, ...); `on_hook` is called on the event loop. `timeouts` overrides
+    DEFAULT_STAGE_TIMEOUTS per stage (None disables a timeout); a stage that runs out raises
+    TimeoutError. At most DEFAULT_CONCURRENCY runs per event loop proceed at once unless another
+    `semaphore` is given; the rest wait for a slot.
+    """
+    timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(timeouts or {})}
+    semaphore = semaphore if semaphore is not None else _default_semaphore()
+    recorder = make_recorder(collect_metrics)
+    async with semaphore:
+        start = time.perf_counter()
+        with metrics.recording(recorder):
+            # The lookup may read the earlier run from the SQLite run store.
+            match, previous = await asyncio.to_thread(
+                semantic_match, run_index, product_info, n_hooks, base_instruction, options
+            )
+            if match is not None and match[0] == "hooks":
+                run_data = cached_run_data(previous, product_info, n_hooks, options.get("on_hook"))
+            else:
+                results, timings = await build_pipeline(
+                    product_info, n_hooks, base_instruction, asynchronous=True,
+                    **reuse_options(match, previous, product_info, options)
+                ).arun(timeouts)
+                run_data = make_run_data(product_info, n_hooks, base_instruction, results, timings)
+    # Exporting the metrics writes files.
+    return await asyncio.to_thread(finish_run, run_data, start, match, recorder, product_info)
@@ -0,0 +1,166 @@
+"""
+Headless batch runner: generates hooks for every product in a JSONL or CSV file.
+
+Usage: python -m modules.batch products.jsonl --output runs.jsonl --secrets .streamlit/secrets.toml
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import config, llm_client, metrics, pipeline, reddit_data, reddit_cache
+from .defaults import DEFAULT_BASE_INSTRUCTION
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_FETCH_WORKERS = 8
+
+
+def load_products(path: str) -> list:
+    """
+    Reads product-info dicts from a JSONL file (one object per line) or a CSV file (one product per row).
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            return [{key: value for key, value in row.items() if key} for row in csv.DictReader(f)]
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class SharedFetcher:
+    """
+    Fetches each subreddit at most once per batch: products that discover overlapping subreddits
+    wait on the same in-flight request instead of issuing their own. Usable as a pipeline `fetcher`.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_FETCH_WORKERS, cache=None, reddit_factory=None):
+        self.cache = cache
+        self.reddit_factory = reddit_factory or reddit_data._make_reddit
+        self.stats = {"fetched": 0, "shared": 0}
+        self._futures = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shared-fetch")
+
+    def _reddit(self):
+        # One client per fetch thread, reused across products so OAuth tokens are fetched once per thread.
+        if not hasattr(self._local, "reddit"):
+            self._local.reddit = self.reddit_factory()
+        return self._local.reddit
+
+    def _fetch_one(self, subreddit: str, limit: int) -> list:
+        fetched = reddit_data.fetch_reddit_data(
+            [subreddit], limit=limit, max_workers=1, reddit_factory=self._reddit, cache=self.cache
+        )
+        return fetched.get(subreddit)
+
+    def __call__(self, subreddits: list, limit: int):
+        futures = {}
+        with self._lock:
+            for subreddit in subreddits:
+                key = (subreddit.lower(), limit)
+                if key in self._futures:
+                    self.stats["shared"] += 1
+                else:
+                    self._futures[key] = metrics.submit(self._executor, self._fetch_one, subreddit, limit)
+                    self.stats["fetched"] += 1
+                futures[self._futures[key]] = subreddit
+        for future in as_completed(futures):
+            posts = future.result()
+            if posts is not None:
+                yield futures[future], posts
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+def run_batch(products: list, output_path: str, n_hooks: int = 3, base_instruction: str = DEFAULT_BASE_INSTRUCTION,
+              concurrency: int = DEFAULT_CONCURRENCY, use_cache: bool = True, reddit_factory=None,
+              keyword_mode: str = "llm", fetch_mode: str = "hot") -> dict:
+    """
+    Runs the pipeline for every product, `concurrency` products at a time, appending one JSON
+    record per product to output_path as each finishes. Failed products are recorded with their error.
+    With use_cache=False the Reddit cache is skipped and hooks are generated fresh.
+    Returns a summary with counts and elapsed seconds.
+    """
+    cache = reddit_cache.get_cache() if use_cache else None
+    fetcher = SharedFetcher(cache=cache, reddit_factory=reddit_factory)
+    write_lock = threading.Lock()
+    summary = {"products": len(products), "succeeded": 0, "failed": 0}
+    start = time.perf_counter()
+
+    def run_one(product_info):
+        product_instruction = product_info.pop("BASE_INSTRUCTION", None) or base_instruction
+        return pipeline.run_pipeline(
+            product_info, n_hooks, product_instruction, fetcher=fetcher, bypass_cache=not use_cache,
+            keyword_mode=keyword_mode, fetch_mode=fetch_mode
+        )
+
+    directory = os.path.dirname(output_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    try:
+        with open(output_path, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+            futures = {executor.submit(run_one, dict(product)): i for i, product in enumerate(products)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    record = {"index": index, **future.result()}
+                    summary["succeeded"] += 1
+                except Exception as e:
+                    logger.exception(f"Product {index} failed")
+                    record = {"index": index, "marketing_inputs": products[index], "error": str(e)}
+                    summary["failed"] += 1
+                with write_lock:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+    finally:
+        fetcher.close()
+    summary["elapsed"] = time.perf_counter() - start
+    summary["subreddit_fetches"] = fetcher.stats
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate hooks for a batch of products.")
+    parser.add_argument("input", help="JSONL or CSV file of product-info records")
+    parser.add_argument("--output", default=os.path.join("outputs", "batch_runs.jsonl"),
+                        help="JSONL file that receives one run_data record per product")
+    parser.add_argument("--secrets", help="TOML file with [openai] and [reddit] sections")
+    parser.add_argument("--n-hooks", type=int, default=3)
+    parser.add_argument("--base-instruction-file", help="Text file overriding the default base instruction")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Products processed at once")
+    parser.add_argument("--rpm", type=float, help="Global OpenAI request limit per minute")
+    parser.add_argument("--keyword-mode", choices=("llm", "local", "hybrid"), default="llm",
+                        help="Refine keywords with the LLM, locally over all posts, or both")
+    parser.add_argument("--fetch-mode", choices=("hot", "stream"), default="hot",
+                        help="Fetch hot posts (shared and cached), or stream hot/top/new with early stopping")
+    parser.add_argument("--metrics-jsonl", help="Append each run's spans and counters to this JSONL file")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the Reddit cache and generate fresh hooks")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.secrets:
+        config.load_file(args.secrets)
+    if args.rpm:
+        llm_client.configure(RATE_LIMIT_RPM=args.rpm)
+    if args.metrics_jsonl:
+        config.configure("metrics", JSONL_PATH=args.metrics_jsonl)
+    base_instruction = DEFAULT_BASE_INSTRUCTION
+    if args.base_instruction_file:
+        with open(args.base_instruction_file, "r", encoding="utf-8") as f:
+            base_instruction = f.read().strip()
+
+    products = load_products(args.input)
+    summary = run_batch(products, args.output, n_hooks=args.n_hooks, base_instruction=base_instruction,
+                        concurrency=args.concurrency, use_cache=not args.no_cache, keyword_mode=args.keyword_mode,
+                        fetch_mode=args.fetch_mode)
+    print(json.dumps(summary, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import threading
+
+ENV_PREFIX = "HOOKGEN_"
+
+_lock = threading.Lock()
+_overrides = {}
+_sections = {}
+
+
+def configure(section: str, **settings) -> None:
+    """
+    Overrides settings of a section ("openai", "reddit"), taking precedence over the environment
+    and st.secrets. Already-loaded sections are reloaded on next use.
+    """
+    with _lock:
+        _overrides.setdefault(section, {}).update(settings)
+        _sections.clear()
+
+
+def load_file(path: str) -> None:
+    """
+    Loads settings from a TOML file laid out like .streamlit/secrets.toml ([openai], [reddit], ...).
+    """
+    try:
+        import tomllib
+    except ImportError:
+        # Python < 3.11.
+        import tomli as tomllib
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    for section, settings in data.items():
+        if isinstance(settings, dict):
+            configure(section, **settings)
+
+
+def _streamlit_secrets(section: str) -> dict:
+    # Only consulted inside the Streamlit app, so headless runs never import streamlit.
+    if "streamlit" not in sys.modules:
+        return {}
+    st = sys.modules["streamlit"]
+    try:
+        return dict(st.secrets[section])
+    except Exception:
+        # No secrets file, or no such section in it.
+        return {}
+
+
+def _environment(section: str) -> dict:
+    prefix = f"{ENV_PREFIX}{section.upper()}_"
+    return {key[len(prefix):]: value for key, value in os.environ.items() if key.startswith(prefix)}
+
+
+def get_section(section: str) -> dict:
+    """
+    Returns the settings of a section, merged once per process from st.secrets (when running under
+    Streamlit), HOOKGEN_<SECTION>_<KEY> environment variables and configure() overrides, in increasing precedence.
+    """
+    with _lock:
+        if section not in _sections:
+            _sections[section] = {
+                **_streamlit_secrets(section),
+                **_environment(section),
+                **_overrides.get(section, {}),
+            }
+        return _sections[section]
@@ -1,56 +1,253 @@
 import re
+import bisect
+import heapq
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from .tools import clean_text
+import numpy as np
+from .preprocess import PostRecord, as_record, content_hash, match_normalize
+from .resources import ensure_nltk_resource
 
-nltk.download("vader_lexicon")
-nltk.download("stopwords")
+SENTIMENT_KEYS = ("neg", "neu", "pos", "compound")
+SCORE_CACHE_SIZE = 200_000
+PROCESS_CHUNK_SIZE = 2_000
 
-def analyze_sentiment(documents: List[str]) -> Dict[str, float]:
+_analyzer = None
+_analyzer_lock = threading.Lock()
+_stopwords = None
+_score_cache = OrderedDict()
+_score_cache_lock = threading.Lock()
+
+def get_analyzer():
+    """
+    Returns the process-wide VADER analyzer, importing nltk and loading the lexicon on first use.
+    """
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            ensure_nltk_resource("sentiment/vader_lexicon.zip")
+            from nltk.sentiment.vader import SentimentIntensityAnalyzer
+            _analyzer = SentimentIntensityAnalyzer()
+        return _analyzer
+
+def get_stopwords() -> frozenset:
+    """
+    Returns NLTK's English stopwords, loaded on first use.
+    """
+    global _stopwords
+    if _stopwords is None:
+        ensure_nltk_resource("corpora/stopwords")
+        from nltk.corpus import stopwords
+        _stopwords = frozenset(stopwords.words("english"))
+    return _stopwords
+
+def _score_chunk(documents: List[str]) -> List[tuple]:
+    sid = get_analyzer()
+    return [tuple(sid.polarity_scores(doc)[key] for key in SENTIMENT_KEYS) for doc in documents]
+
+def score_documents(documents: List[str], processes: int = None) -> np.ndarray:
+    """
+    Returns an (n, 4) array of VADER scores (columns in SENTIMENT_KEYS order), one row per document.
+    Documents are strings or preprocess.PostRecords, whose precomputed hashes are reused.
+    Scores are kept in an LRU cache of SCORE_CACHE_SIZE entries by content hash, so unchanged posts
+    are not scored twice; with `processes`,
+    uncached documents are scored on a process pool in chunks.
+    """
+    hashes = [doc.hash if isinstance(doc, PostRecord) else content_hash(doc) for doc in documents]
+    documents = [doc.text if isinstance(doc, PostRecord) else doc for doc in documents]
+    scores = np.zeros((len(documents), len(SENTIMENT_KEYS)))
+    missing = {}
+    with _score_cache_lock:
+        for i, digest in enumerate(hashes):
+            cached = _score_cache.get(digest)
+            if cached is None:
+                missing.setdefault(digest, i)
+            else:
+                _score_cache.move_to_end(digest)
+                scores[i] = cached
+    if missing:
+        docs = [documents[i] for i in missing.values()]
+        if processes and processes > 1 and len(docs) > PROCESS_CHUNK_SIZE:
+            chunks = [docs[i:i + PROCESS_CHUNK_SIZE] for i in range(0, len(docs), PROCESS_CHUNK_SIZE)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                new_scores = [row for chunk in executor.map(_score_chunk, chunks) for row in chunk]
+        else:
+            new_scores = _score_chunk(docs)
+        with _score_cache_lock:
+            for digest, row in zip(missing, new_scores):
+                _score_cache[digest] = row
+            while len(_score_cache) > SCORE_CACHE_SIZE:
+                _score_cache.popitem(last=False)
+        new_rows = dict(zip(missing, new_scores))
+        for i, digest in enumerate(hashes):
+            if digest in new_rows:
+                scores[i] = new_rows[digest]
+    return scores
+
+def analyze_sentiment(documents: List[str], processes: int = None) -> Dict[str, float]:
     """
     Computes the average sentiment scores for a list of documents using VADER.
     """
-    sid = SentimentIntensityAnalyzer()
-    sentiments = {"neg": 0, "neu": 0, "pos": 0, "compound": 0}
-    count = 0
-    for doc in documents:
-        scores = sid.polarity_scores(doc)
-        for key in sentiments:
-            sentiments[key] += scores[key]
-        count += 1
-    if count > 0:
-        sentiments = {k: v / count for k, v in sentiments.items()}
-    return sentiments
+    if not documents:
+        return {"neg": 0, "neu": 0, "pos": 0, "compound": 0}
+    means = score_documents(documents, processes).mean(axis=0)
+    return {key: float(value) for key, value in zip(SENTIMENT_KEYS, means)}
 
-def extract_hook_examples(reddit_data: Dict[str, List[str]], example_limit: int = 3) -> List[str]:
+def sentiment_frame(reddit_data: Dict[str, List[str]], processes: int = None):
+    """
+    Scores every post and returns a pandas DataFrame with one row per post: subreddit plus the four VADER scores.
+    """
+    import pandas as pd
+    subreddits = [sub for sub, posts in reddit_data.items() for _ in posts]
+    documents = [post for posts in reddit_data.values() for post in posts]
+    frame = pd.DataFrame(score_documents(documents, processes), columns=list(SENTIMENT_KEYS))
+    frame.insert(0, "subreddit", subreddits)
+    return frame
+
+def summarize_sentiment(frame) -> Dict[str, dict]:
+    """
+    Aggregates a sentiment_frame into overall means and medians and per-subreddit means.
+    """
+    if frame.empty:
+        zeros = {key: 0 for key in SENTIMENT_KEYS}
+        return {"mean": zeros, "median": dict(zeros), "by_subreddit": {}}
+    scores = frame[list(SENTIMENT_KEYS)]
+    return {
+        "mean": scores.mean().to_dict(),
+        "median": scores.median().to_dict(),
+        "by_subreddit": frame.groupby("subreddit", sort=False)[list(SENTIMENT_KEYS)].mean().to_dict(orient="index"),
+    }
+
+_TEMPLATE_SLOT = re.compile(r"_{2,}|\[[^\]]*\]|[.!?,:;\u2026]+")
+MIN_FRAGMENT_CHARS = 8
+MIN_SENTENCE_CHARS = 20
+MAX_SENTENCE_CHARS = 160
+
+class HookMatcher:
+    """
+    One compiled alternation over the fixed phrases of HOOK_TEMPLATES: each template is cut at its
+    [Topic]/_______ slots and punctuation, and every fragment of two or more words becomes a pattern
+    that maps back to the templates containing it.
     """
-    Scans through Reddit data (grouped by subreddit) and returns sentences that look like potential hooks.
-    """
-    examples = []
-    hook_keywords = [
-        "stop scrolling",
-        "the best way",
-        "put your phone down",
-        "this is what happens when",
-        "have you heard",
-        "did you know",
-        "here's a fun fact",
-        "this will blow",
-        "here's the truth",
-        "did it ever occur",
-        "forget everything you know about"
-    ]
-    for subreddit, posts in reddit_data.items():
+
+    def __init__(self, templates: List[str]):
+        self.fragment_templates = {}
+        self.template_chars = {}
+        for template in templates:
+            fragments = [
+                " ".join(part.split()).lower()
+                for part in _TEMPLATE_SLOT.split(match_normalize(template))
+            ]
+            fragments = [f for f in fragments if len(f) >= MIN_FRAGMENT_CHARS and " " in f]
+            self.template_chars[template] = sum(len(f) for f in fragments)
+            for fragment in fragments:
+                self.fragment_templates.setdefault(fragment, []).append(template)
+        alternation = "|".join(
+            re.escape(f).replace(r"\ ", r"\s+") for f in sorted(self.fragment_templates, key=len, reverse=True)
+        )
+        self.pattern = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+        # Fragments are lowercase, so the lowercase view of a post needs no case folding.
+        self.lower_pattern = re.compile(rf"\b(?:{alternation})\b")
+
+    def match_post(self, post):
+        """
+        Scans a post (a string or preprocess.PostRecord) once and yields (sentence, template, score) for
+        every sentence with a template phrase. The score is the share of the template's fixed text found
+        in the sentence, plus a bonus when the phrase opens the sentence and a penalty for overly long sentences.
+        """
+        record = as_record(post)
+        if record.lower is not None:
+            found = list(self.lower_pattern.finditer(record.lower))
+        else:
+            found = list(self.pattern.finditer(record.normalized))
+        if not found:
+            return
+        post = record.text
+        spans = record.sentences
+        starts = [start for start, _ in spans]
+        matches = {}
+        for match in found:
+            matches.setdefault(spans[bisect.bisect_right(starts, match.start()) - 1], []).append(match)
+        for (start, end), sentence_matches in matches.items():
+            sentence = post[start:end].strip()
+            if len(sentence) < MIN_SENTENCE_CHARS:
+                continue
+            offset = start + len(post[start:end]) - len(post[start:end].lstrip())
+            coverage = {}
+            opens = False
+            for match in sentence_matches:
+                fragment = " ".join(match.group(0).split()).lower()
+                opens = opens or match.start() == offset
+                for template in self.fragment_templates[fragment]:
+                    coverage[template] = coverage.get(template, 0) + len(fragment)
+            template = max(coverage, key=lambda t: coverage[t] / self.template_chars[t])
+            score = coverage[template] / self.template_chars[template]
+            score += 0.5 if opens else 0.0
+            score -= max(0, len(sentence) - MAX_SENTENCE_CHARS) / MAX_SENTENCE_CHARS
+            yield sentence, template, score
+
+_hook_matcher = None
+
+def get_hook_matcher() -> HookMatcher:
+    """
+    Returns the matcher built from prompt_generator.HOOK_TEMPLATES, compiled on first use.
+    """
+    global _hook_matcher
+    if _hook_matcher is None:
+        from .prompt_generator import HOOK_TEMPLATES
+        _hook_matcher = HookMatcher(HOOK_TEMPLATES)
+    return _hook_matcher
+
+class HookExampleRanker:
+    """
+    Keeps the k best hook-like sentences seen so far, so posts can be ranked as they arrive.
+    `seen` holds every distinct matching sentence.
+    """
+
+    def __init__(self, k: int = 3):
+        self.k = k
+        self.matcher = get_hook_matcher()
+        self.seen = set()
+        self._heap = []
+        self._order = 0
+
+    def add(self, subreddit: str, posts) -> None:
         for post in posts:
-            sentences = re.split(r'[.!?]', post)
-            for sentence in sentences:
-                sentence_clean = sentence.strip()
-                if len(sentence_clean) < 20:
+            for sentence, template, score in self.matcher.match_post(post):
+                if sentence in self.seen:
                     continue
-                sentence_lower = sentence_clean.lower()
-                if any(keyword in sentence_lower for keyword in hook_keywords):
-                    examples.append(sentence_clean)
-                    if len(examples) >= example_limit:
-                        return examples
-    return examples
+                self.seen.add(sentence)
+                # Earlier sentences win ties, which keeps results stable across runs.
+                entry = (score, -self._order, sentence, template, subreddit)
+                self._order += 1
+                if len(self._heap) < self.k:
+                    heapq.heappush(self._heap, entry)
+                elif entry > self._heap[0]:
+                    heapq.heapreplace(self._heap, entry)
+
+    def results(self) -> List[dict]:
+        """
+        Returns the best sentences so far, best first, as dicts with text, template, score and subreddit.
+        """
+        return [
+            {"text": sentence, "template": template, "score": round(score, 4), "subreddit": subreddit}
+            for score, _, sentence, template, subreddit in sorted(self._heap, reverse=True)
+        ]
+
+def rank_hook_examples(reddit_data, k: int = 3) -> List[dict]:
+    """
+    Streams over Reddit posts, given as {subreddit: [posts]} or an iterable of (subreddit, posts) pairs,
+    and returns the k best hook-like sentences as dicts with text, template, score and subreddit.
+    """
+    ranker = HookExampleRanker(k)
+    pairs = reddit_data.items() if isinstance(reddit_data, dict) else reddit_data
+    for subreddit, posts in pairs:
+        ranker.add(subreddit, posts)
+    return ranker.results()
+
+def extract_hook_examples(reddit_data: Dict[str, List[str]], example_limit: int = 3) -> List[str]:
+    """
+    Scans through Reddit data (grouped by subreddit) and returns the best-ranked sentences that look like potential hooks.
+    """
+    return [example["text"] for example in rank_hook_examples(reddit_data, k=example_limit)]
@@ -1,7 +1,10 @@
 import json
 import os
+from . import profile_store
 
+# Read once to import the inputs saved by earlier versions into the default profile.
 TEMP_FILE = "temp.json"
+DEFAULT_PROFILE = "default"
 
 DEFAULT_PRODUCT_INFO = {
     "PRODUCT_NAME": "FastingPro",
@@ -19,19 +22,30 @@ DEFAULT_BASE_INSTRUCTION = (
     "Do not be generic; be bold, vivid, and tailored to the product."
 )
 
-def save_defaults(product_info: dict, base_instruction: str):
-    defaults = {"product_info": product_info, "base_instruction": base_instruction}
-    with open(TEMP_FILE, "w", encoding="utf-8") as f:
-        json.dump(defaults, f, indent=4, ensure_ascii=False)
+def save_defaults(product_info: dict, base_instruction: str, profile: str = DEFAULT_PROFILE):
+    """
+    Saves the inputs as a named profile (atomically, see profile_store).
+    """
+    profile_store.get_store().save(profile, {"product_info": product_info, "base_instruction": base_instruction})
 
-def load_defaults():
-    if os.path.exists(TEMP_FILE):
+def load_defaults(profile: str = DEFAULT_PROFILE) -> dict:
+    """
+    Returns the saved inputs of a profile, or the built-in defaults when it was never saved.
+    The default profile is imported from a legacy temp.json on first use.
+    """
+    store = profile_store.get_store()
+    saved = store.load(profile)
+    if saved is None and profile == DEFAULT_PROFILE and os.path.exists(TEMP_FILE):
         with open(TEMP_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    else:
-        return {"product_info": DEFAULT_PRODUCT_INFO, "base_instruction": DEFAULT_BASE_INSTRUCTION}
+            saved = json.load(f)
+        store.save(profile, saved)
+    if saved is None:
+        return {"product_info": dict(DEFAULT_PRODUCT_INFO), "base_instruction": DEFAULT_BASE_INSTRUCTION}
+    return saved
 
-def revert_to_defaults():
-    defaults_dict = {"product_info": DEFAULT_PRODUCT_INFO, "base_instruction": DEFAULT_BASE_INSTRUCTION}
-    save_defaults(DEFAULT_PRODUCT_INFO, DEFAULT_BASE_INSTRUCTION)
-    return defaults_dict
+def revert_to_defaults(profile: str = DEFAULT_PROFILE) -> dict:
+    """
+    Overwrites a profile with the built-in defaults and returns them.
+    """
+    save_defaults(DEFAULT_PRODUCT_INFO, DEFAULT_BASE_INSTRUCTION, profile)
+    return {"product_info": dict(DEFAULT_PRODUCT_INFO), "base_instruction": DEFAULT_BASE_INSTRUCTION}
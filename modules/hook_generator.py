@@ -1,14 +1,35 @@
-import streamlit as st
-from openai import OpenAI
+import asyncio
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .llm_client import acreate_response, astream_response, create_response, stream_response
+from . import metrics
+from .tools import normalize_text
 
-def generate_refined_keywords(product_info: dict, aggregated_text: str) -> list:
-    """
-    Uses OpenAI API with credentials from st.secrets to generate a comma-separated list of product-relevant keywords.
-    """
-    client = OpenAI(api_key=st.secrets["openai"]["OPENAI_API_KEY"])
-    model_name = st.secrets["openai"].get("MODEL_NAME", "gpt-4o")
-    temperature = float(st.secrets["openai"].get("TEMPERATURE", 0.7))
-    
+logger = logging.getLogger(__name__)
+
+HOOK_DEVELOPER_MESSAGE = (
+    "You are a creative copywriter who specializes in producing hooks that immediately capture attention. "
+    "Your hooks should blend elements from the provided hook templates with language inspired by the product details and real Reddit data. "
+    "Do not be generic—make each hook distinct and memorable."
+)
+
+KEYWORD_EXCERPT_CHARS = 1000
+DUPLICATE_THRESHOLD = 0.6
+SHINGLE_SIZE = 5
+_LIST_MARKER = re.compile(r"^\s*(?:\d+[.)]|[-*\u2022])\s*")
+_NON_WORD = re.compile(r"[\W_]+")
+
+def _keyword_candidates(product_info: dict, aggregated_text: str, mode: str, documents, n_keywords: int):
+    if mode not in ("llm", "local", "hybrid"):
+        raise ValueError(f"Unknown keyword mode: {mode}")
+    if mode == "llm":
+        return None
+    from .keyword_extraction import extract_keywords
+    return extract_keywords(documents if documents is not None else [aggregated_text], product_info, n_keywords)
+
+def _keyword_prompt(product_info: dict, aggregated_text: str, candidates: list = None) -> str:
     prompt = (
         "You are an expert in marketing and keyword analysis. Given the following product information and Reddit data, "
         "generate a concise, comma-separated list of keywords that best represent the product. "
@@ -17,15 +38,16 @@ def generate_refined_keywords(product_info: dict, aggregated_text: str) -> list:
     )
     for key, value in product_info.items():
         prompt += f"- {key}: {value}\n"
-    prompt += "\nReddit Data (first 1000 characters):\n" + aggregated_text[:1000] + "\n\nKeywords:"
-    
-    response = client.responses.create(
-        model=model_name,
-        input=[{"role": "user", "content": prompt}],
-        temperature=temperature
-    )
-    
-    output = response.output_text
+    if candidates is not None:
+        prompt += "\nCandidate keywords extracted from all Reddit posts:\n" + ", ".join(candidates) + "\n\nKeywords:"
+    else:
+        prompt += (
+            f"\nReddit Data (first {KEYWORD_EXCERPT_CHARS} characters):\n"
+            + aggregated_text[:KEYWORD_EXCERPT_CHARS] + "\n\nKeywords:"
+        )
+    return prompt
+
+def _parse_keywords(output) -> list:
     if isinstance(output, list):
         refined = output[0].get("content", "")
     elif isinstance(output, str):
@@ -35,37 +57,69 @@ def generate_refined_keywords(product_info: dict, aggregated_text: str) -> list:
     refined_keywords = [kw.strip() for kw in refined.split(",") if kw.strip()]
     return refined_keywords
 
-def generate_hook(prompt: str) -> str:
+def generate_refined_keywords(product_info: dict, aggregated_text: str, bypass_cache: bool = False,
+                              mode: str = "llm", documents=None, n_keywords: int = 20) -> list:
     """
-    Uses OpenAI API with credentials from st.secrets to generate content hooks.
-    Returns a newline-separated string of hooks.
+    Generates a list of product-relevant keywords.
+    mode="llm" asks the shared OpenAI client, with the first KEYWORD_EXCERPT_CHARS of Reddit text as context.
+    mode="local" extracts them with RAKE over the whole corpus (`documents`, or the aggregated text) without an API call.
+    mode="hybrid" extracts local candidates from the whole corpus and has the LLM refine those instead of the excerpt.
+    Identical LLM requests are served from the LLM response cache unless bypass_cache is set.
+    If the LLM call fails for good, the local keywords are returned instead, so the run can go on.
     """
-    client = OpenAI(api_key=st.secrets["openai"]["OPENAI_API_KEY"])
-    model_name = st.secrets["openai"].get("MODEL_NAME", "gpt-4o")
-    temperature = float(st.secrets["openai"].get("TEMPERATURE", 0.7))
-    
-    input_messages = [
-        {
-            "role": "developer",
-            "content": (
-                "You are a creative copywriter who specializes in producing hooks that immediately capture attention. "
-                "Your hooks should blend elements from the provided hook templates with language inspired by the product details and real Reddit data. "
-                "Do not be generic—make each hook distinct and memorable."
+    candidates = _keyword_candidates(product_info, aggregated_text, mode, documents, n_keywords)
+    if mode == "local":
+        return candidates
+    prompt = _keyword_prompt(product_info, aggregated_text, candidates)
+    try:
+        output = create_response([{"role": "user", "content": prompt}], bypass_cache=bypass_cache)
+    except Exception as e:
+        return _keyword_fallback(e, product_info, aggregated_text, candidates, documents, n_keywords)
+    return _parse_keywords(output)
+
+def _keyword_fallback(error, product_info: dict, aggregated_text: str, candidates, documents, n_keywords: int) -> list:
+    logger.warning(f"Keyword refinement failed ({error}), using locally extracted keywords")
+    metrics.incr("keywords_fallback")
+    if candidates is not None:
+        return candidates
+    return _keyword_candidates(product_info, aggregated_text, "local", documents, n_keywords)
+
+async def agenerate_refined_keywords(product_info: dict, aggregated_text: str, bypass_cache: bool = False,
+                                     mode: str = "llm", documents=None, n_keywords: int = 20) -> list:
+    """
+    Async variant of generate_refined_keywords; local extraction runs in a worker thread.
+    """
+    candidates = None
+    if mode != "llm":
+        candidates = await asyncio.to_thread(
+            _keyword_candidates, product_info, aggregated_text, mode, documents, n_keywords
+        )
+    if mode == "local":
+        return candidates
+    prompt = _keyword_prompt(product_info, aggregated_text, candidates)
+    try:
+        output = await acreate_response([{"role": "user", "content": prompt}], bypass_cache=bypass_cache)
+    except Exception as e:
+        if candidates is None:
+            candidates = await asyncio.to_thread(
+                _keyword_candidates, product_info, aggregated_text, "local", documents, n_keywords
             )
-        },
-        {
-            "role": "user",
-            "content": prompt
-        }
+        return _keyword_fallback(e, product_info, aggregated_text, candidates, documents, n_keywords)
+    return _parse_keywords(output)
+
+def _hook_messages(prompt: str) -> list:
+    return [
+        {"role": "developer", "content": HOOK_DEVELOPER_MESSAGE},
+        {"role": "user", "content": prompt}
     ]
-    
-    response = client.responses.create(
-        model=model_name,
-        input=input_messages,
-        temperature=temperature
-    )
-    
-    output = response.output_text
+
+def split_hooks(generated_text: str) -> list:
+    """
+    Splits a generated completion into normalized hooks, one per non-empty line.
+    """
+    return [normalize_text(hook.strip()) for hook in generated_text.splitlines() if hook.strip()]
+
+def _hook_text(output) -> str:
     generated_text = ""
     if isinstance(output, list):
         for msg in output:
@@ -79,3 +133,151 @@ def generate_hook(prompt: str) -> str:
         generated_text = str(output)
     
     return generated_text.strip()
+
+def generate_hook(prompt: str, bypass_cache: bool = False) -> str:
+    """
+    Uses the shared OpenAI client to generate content hooks.
+    Returns a newline-separated string of hooks. Set bypass_cache for fresh creative output
+    instead of a cached completion of the same prompt.
+    """
+    return _hook_text(create_response(_hook_messages(prompt), bypass_cache=bypass_cache))
+
+async def agenerate_hook(prompt: str, bypass_cache: bool = False) -> str:
+    """
+    Async variant of generate_hook.
+    """
+    return _hook_text(await acreate_response(_hook_messages(prompt), bypass_cache=bypass_cache))
+
+
+def generate_hook_stream(prompt: str, bypass_cache: bool = False, timings: dict = None):
+    """
+    Streaming variant of generate_hook: yields each normalized hook as soon as its line of the
+    completion is complete. When a `timings` dict is given, it receives "time_to_first_hook"
+    and "generate" (total seconds).
+    """
+    lines = _HookLines(timings)
+    for delta in stream_response(_hook_messages(prompt), bypass_cache=bypass_cache):
+        yield from lines.feed(delta)
+    yield from lines.close()
+
+
+async def agenerate_hook_stream(prompt: str, bypass_cache: bool = False, timings: dict = None):
+    """
+    Async variant of generate_hook_stream, streaming with the event loop's AsyncOpenAI client.
+    """
+    lines = _HookLines(timings)
+    async for delta in astream_response(_hook_messages(prompt), bypass_cache=bypass_cache):
+        for hook in lines.feed(delta):
+            yield hook
+    for hook in lines.close():
+        yield hook
+
+
+class _HookLines:
+    """
+    Splits streamed completion text into hooks at line ends and records the stream timings.
+    """
+
+    def __init__(self, timings: dict = None):
+        self.timings = timings
+        self.start = time.perf_counter()
+        self.first_hook_at = None
+        self.buffer = ""
+
+    def feed(self, delta: str) -> list:
+        self.buffer += delta
+        *lines, self.buffer = self.buffer.split("\n")
+        return self._hooks(split_hooks("\n".join(lines)))
+
+    def close(self) -> list:
+        hooks = self._hooks(split_hooks(self.buffer))
+        self.buffer = ""
+        if self.timings is not None:
+            self.timings["time_to_first_hook"] = self.first_hook_at
+            self.timings["generate"] = time.perf_counter() - self.start
+        return hooks
+
+    def _hooks(self, hooks: list) -> list:
+        if hooks and self.first_hook_at is None:
+            self.first_hook_at = time.perf_counter() - self.start
+            logger.info(f"Time to first hook: {self.first_hook_at:.3f}s")
+        return hooks
+
+
+def generate_hooks_fanout(prompts: list, bypass_cache: bool = False) -> list:
+    """
+    Sends each prompt as its own completion in parallel and returns all hooks, in prompt order.
+    A failed completion is logged and skipped; the call only fails when every completion does.
+    """
+    def generate(prompt):
+        return split_hooks(generate_hook(prompt, bypass_cache=bypass_cache))
+
+    hooks, errors = [], []
+    with ThreadPoolExecutor(max_workers=max(len(prompts), 1), thread_name_prefix="hook-fanout") as executor:
+        futures = [metrics.submit(executor, generate, prompt) for prompt in prompts]
+        for future in futures:
+            try:
+                hooks.extend(future.result())
+            except Exception as e:
+                logger.warning(f"Hook completion failed: {e}")
+                errors.append(e)
+    if errors and len(errors) == len(prompts):
+        raise errors[0]
+    return hooks
+
+
+async def agenerate_hooks_fanout(prompts: list, bypass_cache: bool = False) -> list:
+    """
+    Async variant of generate_hooks_fanout; the completions run concurrently on the event loop.
+    """
+    outputs = await asyncio.gather(
+        *(agenerate_hook(prompt, bypass_cache=bypass_cache) for prompt in prompts), return_exceptions=True
+    )
+    hooks, errors = [], []
+    for output in outputs:
+        if isinstance(output, BaseException):
+            logger.warning(f"Hook completion failed: {output}")
+            errors.append(output)
+        else:
+            hooks.extend(split_hooks(output))
+    if errors and len(errors) == len(prompts):
+        raise errors[0]
+    return hooks
+
+
+def _shingles(hook: str) -> set:
+    text = _NON_WORD.sub(" ", _LIST_MARKER.sub("", normalize_text(hook)).lower()).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def dedupe_hooks(hooks: list, threshold: float = DUPLICATE_THRESHOLD) -> list:
+    """
+    Drops hooks whose character-shingle Jaccard similarity with an earlier hook reaches `threshold`,
+    ignoring case, punctuation and list numbering. Hook lists are short, so exact pairwise
+    Jaccard is cheaper here than MinHash signatures.
+    """
+    kept, kept_shingles = [], []
+    for hook in hooks:
+        shingles = _shingles(hook)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(hook)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def rank_hooks(hooks: list, keywords: list = None) -> list:
+    """
+    Orders hooks by how many distinct keyword words they use, preferring hooks of 6 to 25 words;
+    ties keep their original order.
+    """
+    keyword_words = {w for kw in keywords or [] for w in _NON_WORD.split(kw.lower()) if len(w) >= 4}
+
+    def score(hook):
+        words = set(_NON_WORD.split(hook.lower()))
+        n_words = len(hook.split())
+        return len(words & keyword_words) + (1 if 6 <= n_words <= 25 else 0)
+
+    return sorted(hooks, key=score, reverse=True)
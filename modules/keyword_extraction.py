@@ -0,0 +1,107 @@
+import math
+import re
+from collections import Counter
+from typing import Iterable, List
+from .data_processing import get_stopwords
+from .preprocess import PostRecord, match_normalize
+
+# Words that are everywhere in Reddit text but never describe a product.
+GENERIC_TERMS = frozenset({
+    "http", "https", "www", "com", "org", "net", "reddit", "subreddit", "amp", "edit", "deleted",
+    "removed", "post", "posts", "comment", "comments", "thread", "lol", "im", "ive", "dont", "x200b",
+})
+MAX_PHRASE_WORDS = 3
+PRODUCT_BOOST = 2.0
+
+_WORD = re.compile(r"[a-z][a-z0-9'-]*[a-z0-9]|[a-z]")
+_PHRASE_BREAK = re.compile(r"[.,;:!?()\[\]{}\"\n\r\t/|]+|https?://\S+")
+
+
+def _phrases(lower: str, excluded: frozenset) -> Iterable[tuple]:
+    """
+    RAKE candidate phrases of lowercase text: runs of content words between excluded words and punctuation.
+    """
+    for chunk in _PHRASE_BREAK.split(lower):
+        phrase = []
+        for word in _WORD.findall(chunk):
+            word = word.strip("'")
+            if word in excluded or len(word) < 3 or word.isdigit():
+                if phrase:
+                    yield tuple(phrase)
+                phrase = []
+            else:
+                phrase.append(word)
+                if len(phrase) == MAX_PHRASE_WORDS:
+                    yield tuple(phrase)
+                    phrase = []
+        if phrase:
+            yield tuple(phrase)
+
+
+class KeywordExtractor:
+    """
+    Streaming RAKE keyword extractor: feed documents one at a time, only phrase counts are kept in
+    memory. Phrase scores are the summed degree/frequency of their words, weighted by how often
+    the phrase occurs in the corpus and boosted when it shares words with the product information.
+    """
+
+    def __init__(self, stopwords: frozenset = None):
+        self.stopwords = stopwords if stopwords is not None else get_stopwords()
+        self.excluded = self.stopwords | GENERIC_TERMS
+        self.phrase_freq = Counter()
+        self.documents = 0
+
+    def add(self, document) -> None:
+        """
+        Adds a string or preprocess.PostRecord, reusing the record's lowercase view.
+        """
+        if isinstance(document, PostRecord) and document.lower is not None:
+            lower = document.lower
+        else:
+            lower = match_normalize(str(getattr(document, "text", document))).lower()
+        self.phrase_freq.update(_phrases(lower, self.excluded))
+        self.documents += 1
+
+    def add_all(self, documents: Iterable[str]) -> "KeywordExtractor":
+        for document in documents:
+            self.add(document)
+        return self
+
+    def top(self, n: int = 20, product_info: dict = None) -> List[str]:
+        product_words = set()
+        for value in (product_info or {}).values():
+            product_words.update(_WORD.findall(str(value).lower()))
+        # Word statistics follow from the distinct phrases, so they are only computed here.
+        word_freq, word_degree = Counter(), Counter()
+        for phrase, count in self.phrase_freq.items():
+            for word in phrase:
+                word_freq[word] += count
+                word_degree[word] += count * len(phrase)
+        scored = []
+        for phrase, count in self.phrase_freq.items():
+            score = sum(word_degree[w] / word_freq[w] for w in phrase) * math.log1p(count)
+            if product_words.intersection(phrase):
+                score *= PRODUCT_BOOST
+            scored.append((score, phrase))
+        scored.sort(reverse=True)
+        keywords, seen_words = [], set()
+        for _, phrase in scored:
+            # Skip phrases whose words are all covered by better-scoring ones.
+            if seen_words.issuperset(phrase):
+                continue
+            keywords.append(" ".join(phrase))
+            seen_words.update(phrase)
+            if len(keywords) >= n:
+                break
+        return keywords
+
+
+def extract_keywords(documents: Iterable[str], product_info: dict = None, n: int = 20) -> List[str]:
+    """
+    Extracts the n best keywords from the documents (any iterable, consumed once) and the product information.
+    """
+    extractor = KeywordExtractor()
+    if product_info:
+        extractor.add_all(str(value) for value in product_info.values())
+    extractor.add_all(documents)
+    return extractor.top(n, product_info)
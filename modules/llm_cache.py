@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from . import config, metrics, resilience
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "llm_cache.sqlite3")
+DEFAULT_MEMORY_ENTRIES = 256
+DEFAULT_TTL = 7 * 86400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    output TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def make_key(model: str, temperature: float, messages: list) -> str:
+    """
+    Hashes the request parameters that determine a response into a stable cache key.
+    """
+    payload = json.dumps([model, float(temperature), messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-tier response cache: an in-memory LRU in front of a persistent SQLite table, both expiring
+    entries after `ttl` seconds. Entries hold the response's output_text, the tokens it cost (so hits
+    can report tokens saved) and when it was created.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 ttl: float = DEFAULT_TTL):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.ttl = ttl
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "tokens_saved": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str):
+        """
+        Returns the cached output for the key, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry[2], now):
+                # The disk copy is at least as old, so it has expired too.
+                del self._memory[key]
+                self.stats["misses"] += 1
+                return None
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+            else:
+                row = self._conn.execute(
+                    "SELECT output, tokens, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or self._expired(row[2], now):
+                    self.stats["misses"] += 1
+                    return None
+                entry = (json.loads(row[0]), row[1], row[2])
+                self._remember(key, entry)
+                self.stats["disk_hits"] += 1
+            self.stats["hits"] += 1
+            self.stats["tokens_saved"] += entry[1]
+            return entry[0]
+
+    def put(self, key: str, output, tokens: int = 0) -> None:
+        entry = (output, int(tokens or 0), time.time())
+        with self._lock:
+            self._remember(key, entry)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, json.dumps(output, ensure_ascii=False), entry[1], entry[2]),
+            )
+            self._conn.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - created_at >= self.ttl
+
+    def _remember(self, key: str, entry: tuple) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+def record_usage(usage) -> None:
+    """
+    Counts an API request and its input/output tokens in the current run's metrics.
+    """
+    metrics.incr("llm_requests")
+    if usage is not None:
+        metrics.incr("llm_input_tokens", getattr(usage, "input_tokens", 0) or 0)
+        metrics.incr("llm_output_tokens", getattr(usage, "output_tokens", 0) or 0)
+
+
+def is_retryable(error) -> bool:
+    """
+    True for OpenAI errors worth retrying: connection failures, timeouts, rate limits and server errors.
+    """
+    import openai
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def create_response(client, model: str, messages: list, temperature: float, bypass_cache: bool = False,
+                    cache: LLMCache = None, rate_limiter=None, policy: resilience.Policy = None):
+    """
+    Calls client.responses.create through the response cache and returns the response's output_text.
+    With bypass_cache=True the API is always called and the fresh output replaces the cached one.
+    API calls go through resilience.call for the "openai" endpoint with the given `policy`; every
+    attempt waits on the optional rate_limiter.
+    """
+    cache = cache if cache is not None else get_cache()
+    key = make_key(model, temperature, messages)
+    if not bypass_cache:
+        output = cache.get(key)
+        if output is not None:
+            logger.info(f"LLM cache hit for {model} request {key[:12]}")
+            metrics.incr("llm_cache_hits")
+            return output
+
+    def request():
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return client.responses.create(model=model, input=messages, temperature=temperature)
+
+    response = resilience.call("openai", request, is_retryable, policy)
+    output = response.output_text
+    if not isinstance(output, (str, list)):
+        output = str(output)
+    usage = getattr(response, "usage", None)
+    record_usage(usage)
+    cache.put(key, output, getattr(usage, "total_tokens", 0) if usage is not None else 0)
+    return output
+
+
+async def acreate_response(client, model: str, messages: list, temperature: float, bypass_cache: bool = False,
+                           cache: LLMCache = None, rate_limiter=None, policy: resilience.Policy = None):
+    """
+    Async variant of create_response for an AsyncOpenAI client; the rate limiter is waited on without
+    blocking, and cache reads and writes (SQLite, under a lock) run in a worker thread.
+    """
+    cache = cache if cache is not None else get_cache()
+    key = make_key(model, temperature, messages)
+    if not bypass_cache:
+        output = await asyncio.to_thread(cache.get, key)
+        if output is not None:
+            logger.info(f"LLM cache hit for {model} request {key[:12]}")
+            metrics.incr("llm_cache_hits")
+            return output
+
+    async def request():
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async()
+        return await client.responses.create(model=model, input=messages, temperature=temperature)
+
+    response = await resilience.acall("openai", request, is_retryable, policy)
+    output = response.output_text
+    if not isinstance(output, (str, list)):
+        output = str(output)
+    usage = getattr(response, "usage", None)
+    record_usage(usage)
+    await asyncio.to_thread(cache.put, key, output, getattr(usage, "total_tokens", 0) if usage is not None else 0)
+    return output
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache:
+    """
+    Returns the process-wide LLM response cache, configured from the "openai" settings on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            settings = config.get_section("openai")
+            _default_cache = LLMCache(
+                path=settings.get("CACHE_PATH", DEFAULT_CACHE_PATH),
+                max_memory_entries=int(settings.get("CACHE_MEMORY_ENTRIES", DEFAULT_MEMORY_ENTRIES)),
+                ttl=float(settings.get("CACHE_TTL", DEFAULT_TTL)),
+            )
+        return _default_cache
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from . import config, llm_cache, metrics, resilience
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "gpt-4o"
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_MAX_CONNECTIONS = 20
+
+_lock = threading.Lock()
+_settings = None
+_client = None
+_rate_limiter = None
+# AsyncOpenAI clients hold connections bound to the event loop that opened them, so there is one per loop.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread of the process: allows `rate` requests per second on
+    average, with bursts of up to `burst` requests.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token, borrowing against the future when none is left, and returns the seconds
+        the caller has to wait before its request may go out.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def configure(**settings) -> None:
+    """
+    Overrides settings (OPENAI_API_KEY, MODEL_NAME, TEMPERATURE, BASE_URL, TIMEOUT, ...) before first use,
+    e.g. to point the client at a local server. Drops the current client so the next call rebuilds it.
+    """
+    global _settings, _client, _rate_limiter
+    config.configure("openai", **settings)
+    with _lock:
+        _settings = None
+        _rate_limiter = None
+        _async_clients.clear()
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_settings() -> dict:
+    """
+    Returns the OpenAI settings, read from the "openai" config section once per process.
+    """
+    global _settings
+    with _lock:
+        if _settings is None:
+            source = config.get_section("openai")
+            _settings = {
+                "api_key": source["OPENAI_API_KEY"],
+                "base_url": source.get("BASE_URL"),
+                "model_name": source.get("MODEL_NAME", DEFAULT_MODEL_NAME),
+                "temperature": float(source.get("TEMPERATURE", DEFAULT_TEMPERATURE)),
+                "timeout": float(source.get("TIMEOUT", DEFAULT_TIMEOUT)),
+                "connect_timeout": float(source.get("CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+                "max_retries": int(source.get("MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+                "max_connections": int(source.get("MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+                "rate_limit_rpm": float(source.get("RATE_LIMIT_RPM", 0)),
+            }
+        return _settings
+
+
+def get_client():
+    """
+    Returns the process-wide OpenAI client. Its httpx pool keeps connections alive between calls,
+    so only the first request of a process pays for the TCP/TLS handshake. openai is imported on first use.
+    """
+    global _client
+    settings = get_settings()
+    with _lock:
+        if _client is None:
+            import httpx
+            from openai import OpenAI
+            timeout = httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"])
+            http_client = httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=settings["max_connections"],
+                    max_keepalive_connections=settings["max_connections"],
+                ),
+            )
+            _client = OpenAI(
+                api_key=settings["api_key"],
+                base_url=settings["base_url"],
+                timeout=timeout,
+                # Retries are left to the resilience layer, which also trips the circuit breaker.
+                max_retries=0,
+                http_client=http_client,
+            )
+            logger.info(f"Created shared OpenAI client for model {settings['model_name']}")
+        return _client
+
+
+def get_async_client():
+    """
+    Returns the AsyncOpenAI client of the running event loop, created with the same settings and
+    connection pool limits as the shared sync client.
+    """
+    settings = get_settings()
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            import httpx
+            from openai import AsyncOpenAI
+            timeout = httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"])
+            http_client = httpx.AsyncClient(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=settings["max_connections"],
+                    max_keepalive_connections=settings["max_connections"],
+                ),
+            )
+            client = AsyncOpenAI(
+                api_key=settings["api_key"],
+                base_url=settings["base_url"],
+                timeout=timeout,
+                # Retries are left to the resilience layer, which also trips the circuit breaker.
+                max_retries=0,
+                http_client=http_client,
+            )
+            _async_clients[loop] = client
+        return client
+
+
+def get_rate_limiter():
+    """
+    Returns the process-wide API rate limiter, or None when RATE_LIMIT_RPM is not set.
+    """
+    global _rate_limiter
+    settings = get_settings()
+    with _lock:
+        if _rate_limiter is None and settings["rate_limit_rpm"] > 0:
+            rate = settings["rate_limit_rpm"] / 60
+            _rate_limiter = RateLimiter(rate, burst=max(1, int(rate)))
+        return _rate_limiter
+
+
+def get_policy() -> resilience.Policy:
+    """
+    Returns the resilience policy of OpenAI calls, allowing MAX_RETRIES retries unless the
+    [resilience] settings say otherwise.
+    """
+    return resilience.get_policy("openai", max_attempts=get_settings()["max_retries"] + 1)
+
+
+def create_response(messages: list, temperature: float = None, bypass_cache: bool = False):
+    """
+    Sends a Responses API request with the shared client and configured model, through the response cache,
+    the rate limiter and the resilience layer (retries, hedging, circuit breaker). Returns the response's output_text.
+    """
+    settings = get_settings()
+    if temperature is None:
+        temperature = settings["temperature"]
+    return llm_cache.create_response(
+        get_client(), settings["model_name"], messages, temperature, bypass_cache=bypass_cache,
+        rate_limiter=get_rate_limiter(), policy=get_policy()
+    )
+
+
+async def acreate_response(messages: list, temperature: float = None, bypass_cache: bool = False):
+    """
+    Async variant of create_response, using the event loop's AsyncOpenAI client.
+    """
+    settings = get_settings()
+    if temperature is None:
+        temperature = settings["temperature"]
+    return await llm_cache.acreate_response(
+        get_async_client(), settings["model_name"], messages, temperature, bypass_cache=bypass_cache,
+        rate_limiter=get_rate_limiter(), policy=get_policy()
+    )
+
+
+def stream_response(messages: list, temperature: float = None, bypass_cache: bool = False):
+    """
+    Streams a Responses API request and yields output text deltas as they arrive.
+    A cached output is yielded in one piece; a completed stream is written back to the response cache.
+    """
+    settings = get_settings()
+    if temperature is None:
+        temperature = settings["temperature"]
+    cache = llm_cache.get_cache()
+    key = llm_cache.make_key(settings["model_name"], temperature, messages)
+    if not bypass_cache:
+        output = cache.get(key)
+        if isinstance(output, str):
+            metrics.incr("llm_cache_hits")
+            yield output
+            return
+    rate_limiter = get_rate_limiter()
+
+    def request():
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return get_client().responses.create(
+            model=settings["model_name"], input=messages, temperature=temperature, stream=True
+        )
+
+    # Only opening the stream is retried; text already yielded cannot be taken back.
+    stream = resilience.call("openai", request, llm_cache.is_retryable, get_policy(), hedge=False)
+    chunks, tokens, usage = [], 0, None
+    with stream:
+        for event in stream:
+            if event.type == "response.output_text.delta":
+                chunks.append(event.delta)
+                yield event.delta
+            elif event.type == "response.completed" and event.response.usage is not None:
+                usage = event.response.usage
+                tokens = usage.total_tokens
+    llm_cache.record_usage(usage)
+    cache.put(key, "".join(chunks), tokens)
+
+
+async def astream_response(messages: list, temperature: float = None, bypass_cache: bool = False):
+    """
+    Async variant of stream_response, streaming with the event loop's AsyncOpenAI client.
+    """
+    settings = get_settings()
+    if temperature is None:
+        temperature = settings["temperature"]
+    cache = llm_cache.get_cache()
+    key = llm_cache.make_key(settings["model_name"], temperature, messages)
+    if not bypass_cache:
+        output = await asyncio.to_thread(cache.get, key)
+        if isinstance(output, str):
+            metrics.incr("llm_cache_hits")
+            yield output
+            return
+    rate_limiter = get_rate_limiter()
+    client = get_async_client()
+
+    async def request():
+        if rate_limiter is not None:
+            await rate_limiter.acquire_async()
+        return await client.responses.create(
+            model=settings["model_name"], input=messages, temperature=temperature, stream=True
+        )
+
+    # Only opening the stream is retried; text already yielded cannot be taken back.
+    stream = await resilience.acall("openai", request, llm_cache.is_retryable, get_policy(), hedge=False)
+    chunks, tokens, usage = [], 0, None
+    async with stream:
+        async for event in stream:
+            if event.type == "response.output_text.delta":
+                chunks.append(event.delta)
+                yield event.delta
+            elif event.type == "response.completed" and event.response.usage is not None:
+                usage = event.response.usage
+                tokens = usage.total_tokens
+    llm_cache.record_usage(usage)
+    await asyncio.to_thread(cache.put, key, "".join(chunks), tokens)
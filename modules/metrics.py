@@ -0,0 +1,171 @@
+"""
+Lightweight run instrumentation: spans around pipeline steps and counters for tokens, retries,
+posts and cache hits. Code anywhere in the pipeline calls the module-level span()/incr(), which
+record into the Metrics of the current run (a context variable) and do nothing when no run is
+being recorded. Executors that should attribute their work to the run submit through submit().
+
+Settings ([metrics] section or HOOKGEN_METRICS_* variables):
+    ENABLED           record metrics for every run (default true)
+    JSONL_PATH        append one JSON line per run
+    PROMETHEUS_PATH   rewrite a Prometheus text-format file with the last run's gauges after every
+                      run (node_exporter textfile)
+"""
+import contextvars
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from . import config
+
+_current = contextvars.ContextVar("hookgen_metrics", default=None)
+_NULL_SPAN = nullcontext()
+_export_lock = threading.Lock()
+
+
+class Metrics:
+    """
+    Spans and counters of one run. Thread-safe; spans record their offset from the start of the run.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.spans = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append({
+                    "name": name,
+                    "start": round(start - self._start, 6),
+                    "seconds": round(end - start, 6),
+                    "thread": threading.current_thread().name,
+                })
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {"counters": dict(self.counters), "spans": list(self.spans)}
+
+    def to_prometheus(self, prefix: str = "hookgen_last_run", labels: dict = None) -> str:
+        """
+        Renders the run's counters, the total seconds per span name and the run's end time in
+        Prometheus text format. Each export describes a single run and replaces the previous one, so
+        everything is a gauge (e.g. hookgen_last_run_reddit_posts) rather than a counter that would
+        appear to reset on every run.
+        """
+        label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in (labels or {}).items())
+        data = self.as_dict()
+        lines = []
+        for name, value in sorted(data["counters"].items()):
+            metric = f"{prefix}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{{{label_text}}} {value}")
+        seconds = {}
+        for span in data["spans"]:
+            seconds[span["name"]] = seconds.get(span["name"], 0.0) + span["seconds"]
+        if seconds:
+            metric = f"{prefix}_span_seconds"
+            lines.append(f"# TYPE {metric} gauge")
+            for name, value in sorted(seconds.items()):
+                span_labels = ",".join(filter(None, [label_text, f'span="{_escape(name)}"']))
+                lines.append(f"{metric}{{{span_labels}}} {value:.6f}")
+        metric = f"{prefix}_timestamp_seconds"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric}{{{label_text}}} {time.time():.3f}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def current():
+    """
+    Returns the Metrics being recorded in this context, or None.
+    """
+    return _current.get()
+
+
+def incr(name: str, value: float = 1) -> None:
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.incr(name, value)
+
+
+def span(name: str):
+    metrics = _current.get()
+    return metrics.span(name) if metrics is not None else _NULL_SPAN
+
+
+@contextmanager
+def recording(metrics):
+    """
+    Makes `metrics` (or None, to record nothing) the current recorder inside the block.
+    """
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def submit(executor, func, *args, **kwargs):
+    """
+    executor.submit that runs func in a copy of the caller's context, so it records into the caller's run.
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def enabled() -> bool:
+    return str(config.get_section("metrics").get("ENABLED", True)).lower() not in ("0", "false", "no")
+
+
+def export(metrics: Metrics, labels: dict = None) -> None:
+    """
+    Writes the run's metrics to the configured JSONL and Prometheus files, if any. Exports of
+    concurrent runs are serialized, so JSONL lines never interleave and the last run wins.
+    """
+    settings = config.get_section("metrics")
+    jsonl_path = settings.get("JSONL_PATH")
+    prometheus_path = settings.get("PROMETHEUS_PATH")
+    with _export_lock:
+        if jsonl_path:
+            _ensure_directory(jsonl_path)
+            record = {"timestamp": time.time(), "labels": labels or {}, **metrics.as_dict()}
+            with open(jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if prometheus_path:
+            _ensure_directory(prometheus_path)
+            # Write then rename, so a scraper never reads a half-written file.
+            fd, temporary = tempfile.mkstemp(
+                prefix=os.path.basename(prometheus_path) + ".", suffix=".tmp",
+                dir=os.path.dirname(prometheus_path) or "."
+            )
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(metrics.to_prometheus(labels=labels))
+                # mkstemp creates the file readable by its owner only; scrapers may run as another user.
+                os.chmod(temporary, 0o644)
+                os.replace(temporary, prometheus_path)
+            except BaseException:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                raise
+
+
+def _ensure_directory(path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
@@ -0,0 +1,634 @@
+import asyncio
+import inspect
+import logging
+import math
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from . import reddit_data, data_processing, preprocess, prompt_generator, hook_generator, template_index, metrics
+from .prompt_generator import HOOK_TEMPLATES
+from .run_index import product_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+# Fan-out completions ask for this many more hooks in total than needed, to make up for duplicates.
+FANOUT_OVERGENERATE = 1.25
+# fetch_mode="stream": keys not used for early stopping are passed to reddit_data.iter_reddit_posts.
+DEFAULT_STREAM_OPTIONS = {
+    "listings": reddit_data.DEFAULT_LISTINGS,
+    "limit": 100,
+    "comments": 0,
+    "max_posts": 2000,
+    "max_bytes": 4_000_000,
+    # Early-stopping targets: this many distinct hook-like sentences seen (None: 3 per requested example,
+    # 0: no target), and the standard error of the mean compound sentiment at most this (None: no target).
+    "target_examples": None,
+    "sentiment_stderr": 0.02,
+    # Stop once "either" target is met, or only once "both" are. Without any target, the stream runs
+    # until its caps.
+    "stop_when": "either",
+}
+MIN_SENTIMENT_SAMPLES = 30
+
+
+class Pipeline:
+    """
+    A DAG of named stages. Each stage function is called with the results of its dependencies
+    as keyword arguments, and stages whose dependencies are done run in parallel on a thread pool.
+    Inline stages run on the calling thread instead, e.g. when they drive UI callbacks.
+    run() executes the DAG from synchronous code, arun() on an event loop.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def add_stage(self, name: str, func, deps: tuple = (), inline: bool = False) -> "Pipeline":
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = (func, tuple(deps), inline)
+        return self
+
+    def run(self) -> tuple:
+        """
+        Runs every stage and returns ({stage: result}, {stage: seconds}).
+        The first stage that raises cancels the stages not yet started and re-raises.
+        """
+        results, timings = {}, {}
+        pending = dict(self.stages)
+        running = {}
+
+        def timed(name, func, kwargs):
+            start = time.perf_counter()
+            try:
+                with metrics.span(name):
+                    return func(**kwargs)
+            finally:
+                timings[name] = time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline") as executor:
+            while pending or running:
+                inline_ready = []
+                for name, (func, deps, inline) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        if inline:
+                            inline_ready.append((name, func, kwargs))
+                        else:
+                            running[metrics.submit(executor, timed, name, func, kwargs)] = name
+                        del pending[name]
+                for name, func, kwargs in inline_ready:
+                    try:
+                        results[name] = timed(name, func, kwargs)
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        logger.exception(f"Pipeline stage '{name}' failed")
+                        raise
+                if inline_ready:
+                    continue
+                if not running:
+                    raise ValueError(f"Stages can never run: {sorted(pending)}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        for other in running:
+                            other.cancel()
+                        logger.exception(f"Pipeline stage '{name}' failed")
+                        raise
+        return results, timings
+
+    async def arun(self, timeouts: dict = None) -> tuple:
+        """
+        Async variant of run. Coroutine-function stages are awaited on the event loop, inline stages
+        are called on it and the others run in worker threads. `timeouts` bounds stages by name (None
+        or missing: no bound); a stage that runs out raises TimeoutError, and a worker thread already
+        running it finishes but its result is dropped. The first stage that fails, and cancelling the
+        awaiting task, cancel the stages in flight.
+        """
+        timeouts = timeouts or {}
+        results, timings = {}, {}
+        pending = dict(self.stages)
+        running = {}
+
+        async def timed(name, func, kwargs, inline):
+            start = time.perf_counter()
+            try:
+                with metrics.span(name):
+                    if inspect.iscoroutinefunction(func):
+                        awaitable = func(**kwargs)
+                    elif inline:
+                        return func(**kwargs)
+                    else:
+                        awaitable = asyncio.to_thread(func, **kwargs)
+                    return await asyncio.wait_for(awaitable, timeouts.get(name))
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"Stage '{name}' timed out after {timeouts[name]}s") from None
+            finally:
+                timings[name] = time.perf_counter() - start
+
+        try:
+            while pending or running:
+                for name, (func, deps, inline) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        kwargs = {dep: results[dep] for dep in deps}
+                        running[asyncio.ensure_future(timed(name, func, kwargs, inline))] = name
+                        del pending[name]
+                if not running:
+                    raise ValueError(f"Stages can never run: {sorted(pending)}")
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    try:
+                        results[name] = task.result()
+                    except Exception:
+                        logger.exception(f"Pipeline stage '{name}' failed")
+                        raise
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        return results, timings
+
+
+def _fetch_stage(discover: list, post_limit: int, reddit_cache, reddit_factory, fetcher) -> dict:
+    """
+    Streams subreddits from the fetcher, preprocessing and scoring each one's posts as soon as they
+    arrive, overlapping that work with the downloads still in flight. The scores land in the
+    content-hash cache, so the sentiment stage only aggregates them. Returns the posts and their
+    preprocess.PostRecords, both keyed by subreddit in discovery order.
+    """
+    if fetcher is None:
+        stream = reddit_data.iter_reddit_data(discover, limit=post_limit, reddit_factory=reddit_factory,
+                                              cache=reddit_cache)
+    else:
+        stream = fetcher(discover, post_limit)
+    posts_by_subreddit, records_by_subreddit = {}, {}
+    for subreddit, posts in stream:
+        posts_by_subreddit[subreddit] = posts
+        metrics.incr("reddit_subreddits")
+        metrics.incr("reddit_posts", len(posts))
+        records_by_subreddit[subreddit] = preprocess.preprocess_posts(posts)
+        data_processing.score_documents(records_by_subreddit[subreddit])
+    order = [sub for sub in discover if sub in posts_by_subreddit]
+    return {
+        "posts_by_subreddit": {sub: posts_by_subreddit[sub] for sub in order},
+        "records_by_subreddit": {sub: records_by_subreddit[sub] for sub in order},
+    }
+
+
+class _StreamScan:
+    """
+    Preprocesses, scores and scans the pages of a post stream for hook-like sentences as they arrive,
+    and tells when the early-stopping targets are met.
+    """
+
+    def __init__(self, example_limit: int, options: dict):
+        self.target_examples = options.pop("target_examples")
+        if self.target_examples is None:
+            self.target_examples = 3 * example_limit
+        self.sentiment_stderr = options.pop("sentiment_stderr")
+        self.stop_when = options.pop("stop_when")
+        if self.stop_when not in ("either", "both"):
+            raise ValueError(f"Unknown stop_when: {self.stop_when}")
+        self.ranker = data_processing.HookExampleRanker(example_limit)
+        self.posts_by_subreddit, self.records_by_subreddit = {}, {}
+        self.compound = []
+
+    def add(self, subreddit: str, page: list) -> bool:
+        """
+        Takes one page of the stream and returns True once the stream can stop.
+        """
+        records = preprocess.preprocess_posts(page)
+        self.compound.extend(data_processing.score_documents(records)[:, 3])
+        self.ranker.add(subreddit, records)
+        self.posts_by_subreddit.setdefault(subreddit, []).extend(page)
+        self.records_by_subreddit.setdefault(subreddit, []).extend(records)
+        metrics.incr("reddit_posts", len(page))
+        compound = self.compound
+        met = []
+        if self.target_examples:
+            met.append(len(self.ranker.seen) >= self.target_examples)
+        if self.sentiment_stderr is not None:
+            met.append(
+                len(compound) >= MIN_SENTIMENT_SAMPLES
+                and np.std(compound) / math.sqrt(len(compound)) <= self.sentiment_stderr
+            )
+        if met and (any(met) if self.stop_when == "either" else all(met)):
+            logger.info(f"Stopping the post stream early after {len(compound)} posts")
+            metrics.incr("reddit_stream_early_stops")
+            return True
+        return False
+
+    def result(self, discover: list) -> dict:
+        metrics.incr("reddit_subreddits", len(self.posts_by_subreddit))
+        order = [sub for sub in discover if sub in self.posts_by_subreddit]
+        return {
+            "posts_by_subreddit": {sub: self.posts_by_subreddit[sub] for sub in order},
+            "records_by_subreddit": {sub: self.records_by_subreddit[sub] for sub in order},
+            "examples": self.ranker.results(),
+        }
+
+
+def _stream_fetch_stage(discover: list, example_limit: int, reddit_factory, options: dict) -> dict:
+    """
+    Consumes reddit_data.iter_reddit_posts page by page: each page is preprocessed, scored and scanned
+    for hook-like sentences as it arrives, and the stream is closed as soon as the early-stopping
+    targets are met as "stop_when" asks (or a memory cap is reached). Returns the same shape as
+    _fetch_stage, plus the best `example_limit` hook examples ranked along the way under "examples".
+    """
+    options = {**DEFAULT_STREAM_OPTIONS, **(options or {})}
+    scan = _StreamScan(example_limit, options)
+    stream = reddit_data.iter_reddit_posts(discover, reddit_factory=reddit_factory, **options)
+    try:
+        for subreddit, page in stream:
+            if scan.add(subreddit, page):
+                break
+    finally:
+        stream.close()
+    return scan.result(discover)
+
+
+async def _astream_fetch_stage(discover: list, example_limit: int, reddit_factory, options: dict) -> dict:
+    """
+    Async variant of _stream_fetch_stage over reddit_data.aiter_reddit_posts; the CPU-bound work on
+    each page runs in a worker thread.
+    """
+    options = {**DEFAULT_STREAM_OPTIONS, **(options or {})}
+    scan = _StreamScan(example_limit, options)
+    stream = reddit_data.aiter_reddit_posts(discover, reddit_factory=reddit_factory, **options)
+    try:
+        async for subreddit, page in stream:
+            if await asyncio.to_thread(scan.add, subreddit, page):
+                break
+    finally:
+        await stream.aclose()
+    return scan.result(discover)
+
+
+def build_shard_prompts(product_info: dict, keywords: list, sentiment: dict, example_texts: list, n_hooks: int,
+                        base_instruction: str, n_shards: int, max_tokens: int = None, templates: list = None) -> list:
+    """
+    Builds one prompt per fan-out completion. Each asks for its share of the hooks (plus the
+    overgeneration margin) and gets every n_shards-th template of the relevance-ordered list.
+    """
+    ordered = templates if templates is not None else HOOK_TEMPLATES
+    per_shard = math.ceil(n_hooks * FANOUT_OVERGENERATE / n_shards)
+    return [
+        prompt_generator.build_prompt(
+            product_info, keywords, sentiment, example_texts, per_shard,
+            base_instruction, max_tokens=max_tokens, templates=ordered[i::n_shards]
+        )[0]
+        for i in range(n_shards)
+    ]
+
+
+def merge_fanout(candidates: list, keywords: list, n_hooks: int, n_shards: int) -> dict:
+    """
+    Deduplicates and ranks the hooks of all fan-out completions into the generate stage's result.
+    When fewer than n_hooks distinct hooks are left, the shortfall is logged and recorded under
+    fanout["shortfall"].
+    """
+    unique = hook_generator.dedupe_hooks(candidates)
+    hooks = hook_generator.rank_hooks(unique, keywords)[:n_hooks]
+    fanout = {"completions": n_shards, "candidates": len(candidates), "duplicates": len(candidates) - len(unique)}
+    if len(hooks) < n_hooks:
+        fanout["shortfall"] = n_hooks - len(hooks)
+        metrics.incr("fanout_shortfall", fanout["shortfall"])
+        logger.warning(f"Fan-out produced {len(hooks)} distinct hooks of the {n_hooks} requested")
+    return {"hooks": hooks, "fanout": fanout}
+
+
+def build_pipeline(product_info: dict, n_hooks: int, base_instruction: str, n_subreddits: int = 10,
+                   post_limit: int = 30, example_limit: int = 3, reddit_cache=None, reddit_factory=None,
+                   fetcher=None, bypass_cache: bool = False, on_hook=None, max_prompt_tokens: int = None,
+                   n_templates: int = None, keyword_mode: str = "llm", hooks_per_call: int = None,
+                   fetch_mode: str = "hot", stream_options: dict = None,
+                   max_workers: int = DEFAULT_MAX_WORKERS, reuse: dict = None, asynchronous: bool = False) -> Pipeline:
+    """
+    Builds the hook-generation DAG. Sentiment, hook examples and keyword refinement only depend
+    on the fetched posts, so they run concurrently. When `on_hook` is given, hooks are streamed
+    and passed to it one by one on the calling thread as soon as each is complete.
+    `fetcher(subreddits, limit)` replaces reddit_data.iter_reddit_data, e.g. to share fetches between runs.
+    `n_templates` keeps only the most relevant hook templates according to the template index, and
+    `max_prompt_tokens` caps the estimated prompt size by dropping the least relevant ones.
+    `keyword_mode` selects LLM, local or hybrid keyword refinement (see generate_refined_keywords).
+    When n_hooks exceeds `hooks_per_call`, hooks are generated by parallel smaller completions, each
+    prompted with its own share of the templates, then near-duplicates are removed and the rest ranked.
+    fetch_mode="stream" replaces the hot-listing fetch with a paged stream over several listings (and
+    optionally comments) that stops early once enough examples or a confident sentiment estimate are
+    in (see "stop_when"); `stream_options` overrides DEFAULT_STREAM_OPTIONS. Streams bypass `fetcher` and `reddit_cache`.
+    `reuse` ({"subreddits", "posts_by_subreddit", "keywords"}, e.g. from an earlier similar run) replaces
+    discovery, fetching and keyword refinement (unless "keywords" is None) with the given results.
+    With asynchronous=True the network stages are coroutines (AsyncOpenAI, and asyncpraw for fetches
+    when installed) for Pipeline.arun, and `on_hook` is called on the event loop.
+    """
+    if fetch_mode not in ("hot", "stream"):
+        raise ValueError(f"Unknown fetch mode: {fetch_mode}")
+    n_shards = math.ceil(n_hooks / hooks_per_call) if hooks_per_call and n_hooks > hooks_per_call else 1
+
+    def discover():
+        return reddit_data.discover_subreddits(product_info, n=n_subreddits)
+
+    async def adiscover():
+        return await reddit_data.adiscover_subreddits(product_info, n=n_subreddits)
+
+    def fetch(discover):
+        if reuse is not None:
+            posts_by_subreddit = reuse["posts_by_subreddit"]
+            return _fetch_stage(discover, post_limit, None, None, lambda subreddits, limit: (
+                (subreddit, posts_by_subreddit[subreddit][:limit]) for subreddit in subreddits
+                if subreddit in posts_by_subreddit
+            ))
+        if fetch_mode == "stream":
+            return _stream_fetch_stage(discover, example_limit, reddit_factory, stream_options)
+        return _fetch_stage(discover, post_limit, reddit_cache, reddit_factory, fetcher)
+
+    async def afetch(discover):
+        if reuse is None and fetch_mode == "stream":
+            return await _astream_fetch_stage(discover, example_limit, reddit_factory, stream_options)
+        if reuse is not None or fetcher is not None:
+            return await asyncio.to_thread(fetch, discover)
+        posts_by_subreddit = await reddit_data.afetch_reddit_data(
+            discover, limit=post_limit, reddit_factory=reddit_factory, cache=reddit_cache
+        )
+        # Preprocessing and scoring are CPU-bound, so they stay off the event loop.
+        return await asyncio.to_thread(
+            _fetch_stage, discover, post_limit, None, None, lambda subreddits, limit: posts_by_subreddit.items()
+        )
+
+    def keyword_inputs(fetch) -> tuple:
+        records = [record for records in fetch["records_by_subreddit"].values() for record in records]
+        return preprocess.excerpt(records, hook_generator.KEYWORD_EXCERPT_CHARS), records
+
+    def keywords(fetch):
+        if reuse is not None and reuse.get("keywords") is not None:
+            return reuse["keywords"]
+        excerpt, records = keyword_inputs(fetch)
+        return hook_generator.generate_refined_keywords(product_info, excerpt, mode=keyword_mode, documents=records)
+
+    async def akeywords(fetch):
+        if reuse is not None and reuse.get("keywords") is not None:
+            return reuse["keywords"]
+        excerpt, records = keyword_inputs(fetch)
+        return await hook_generator.agenerate_refined_keywords(
+            product_info, excerpt, mode=keyword_mode, documents=records
+        )
+
+    def sentiment(fetch):
+        return data_processing.summarize_sentiment(data_processing.sentiment_frame(fetch["records_by_subreddit"]))
+
+    def examples(fetch):
+        # Streamed fetches rank the examples while the pages come in.
+        if "examples" in fetch:
+            return fetch["examples"]
+        return data_processing.rank_hook_examples(fetch["records_by_subreddit"], k=example_limit)
+
+    def templates(keywords, examples):
+        index = template_index.get_index()
+        reddit_text = " ".join(example["text"] for example in examples)
+        if n_templates:
+            return index.top_k(n_templates, product_info, keywords, reddit_text)
+        return index.rank(product_info, keywords, reddit_text)
+
+    def prompt(keywords, sentiment, examples, templates=None):
+        example_texts = [example["text"] for example in examples]
+        text, token_counts = prompt_generator.build_prompt(
+            product_info, keywords, sentiment["mean"], example_texts, n_hooks,
+            base_instruction, max_tokens=max_prompt_tokens, templates=templates
+        )
+        result = {"text": text, "token_counts": token_counts}
+        if n_shards > 1:
+            result["shards"] = build_shard_prompts(
+                product_info, keywords, sentiment["mean"], example_texts, n_hooks, base_instruction,
+                n_shards, max_tokens=max_prompt_tokens, templates=templates
+            )
+            # Builds the prompt of a top-up completion for hooks lost to duplicates.
+            result["top_up"] = lambda missing: build_shard_prompts(
+                product_info, keywords, sentiment["mean"], example_texts, missing, base_instruction,
+                1, max_tokens=max_prompt_tokens, templates=templates
+            )
+        return result
+
+    def generate(prompt):
+        generated = hook_generator.generate_hook(prompt["text"], bypass_cache=bypass_cache)
+        return {"hooks": hook_generator.split_hooks(generated)}
+
+    async def agenerate(prompt):
+        generated = await hook_generator.agenerate_hook(prompt["text"], bypass_cache=bypass_cache)
+        return {"hooks": hook_generator.split_hooks(generated)}
+
+    def generate_streaming(prompt):
+        hooks, timings = [], {}
+        for hook in hook_generator.generate_hook_stream(prompt["text"], bypass_cache=bypass_cache, timings=timings):
+            hooks.append(hook)
+            on_hook(hook)
+        return {"hooks": hooks, "time_to_first_hook": timings.get("time_to_first_hook")}
+
+    async def agenerate_streaming(prompt):
+        hooks, timings = [], {}
+        async for hook in hook_generator.agenerate_hook_stream(prompt["text"], bypass_cache=bypass_cache,
+                                                               timings=timings):
+            hooks.append(hook)
+            on_hook(hook)
+        return {"hooks": hooks, "time_to_first_hook": timings.get("time_to_first_hook")}
+
+    def top_up_prompts(prompt, candidates) -> list:
+        missing = n_hooks - len(hook_generator.dedupe_hooks(candidates))
+        # One more completion for the hooks lost to duplicates; a remaining shortfall stays flagged.
+        return prompt["top_up"](missing) if missing > 0 else []
+
+    def fanout_result(prompts, candidates, keywords) -> dict:
+        result = merge_fanout(candidates, keywords, n_hooks, len(prompts))
+        result["fanout"]["top_ups"] = len(prompts) - n_shards
+        result["prompts"] = prompts
+        if on_hook is not None:
+            for hook in result["hooks"]:
+                on_hook(hook)
+        return result
+
+    def generate_fanout(prompt, keywords):
+        prompts = list(prompt["shards"])
+        candidates = hook_generator.generate_hooks_fanout(prompts, bypass_cache=bypass_cache)
+        top_up = top_up_prompts(prompt, candidates)
+        if top_up:
+            try:
+                candidates += hook_generator.generate_hooks_fanout(top_up, bypass_cache=bypass_cache)
+                prompts += top_up
+            except Exception as e:
+                logger.warning(f"Fan-out top-up completion failed: {e}")
+        return fanout_result(prompts, candidates, keywords)
+
+    async def agenerate_fanout(prompt, keywords):
+        prompts = list(prompt["shards"])
+        candidates = await hook_generator.agenerate_hooks_fanout(prompts, bypass_cache=bypass_cache)
+        top_up = top_up_prompts(prompt, candidates)
+        if top_up:
+            try:
+                candidates += await hook_generator.agenerate_hooks_fanout(top_up, bypass_cache=bypass_cache)
+                prompts += top_up
+            except Exception as e:
+                logger.warning(f"Fan-out top-up completion failed: {e}")
+        return fanout_result(prompts, candidates, keywords)
+
+    def pick(func, afunc):
+        return afunc if asynchronous else func
+
+    pipeline = Pipeline(max_workers=max_workers)
+    if reuse is not None:
+        pipeline.add_stage("discover", lambda: list(reuse["subreddits"]))
+    else:
+        pipeline.add_stage("discover", pick(discover, adiscover))
+    pipeline.add_stage("fetch", pick(fetch, afetch), ("discover",))
+    pipeline.add_stage("sentiment", sentiment, ("fetch",))
+    pipeline.add_stage("examples", examples, ("fetch",))
+    pipeline.add_stage("keywords", pick(keywords, akeywords), ("fetch",))
+    if n_templates or max_prompt_tokens:
+        pipeline.add_stage("templates", templates, ("keywords", "examples"))
+        pipeline.add_stage("prompt", prompt, ("keywords", "sentiment", "examples", "templates"))
+    else:
+        pipeline.add_stage("prompt", prompt, ("keywords", "sentiment", "examples"))
+    # Inline stages call on_hook on the calling thread; async stages already run on the event loop.
+    inline = on_hook is not None and not asynchronous
+    if n_shards > 1:
+        pipeline.add_stage("generate", pick(generate_fanout, agenerate_fanout), ("prompt", "keywords"), inline=inline)
+    elif on_hook is None:
+        pipeline.add_stage("generate", pick(generate, agenerate), ("prompt",))
+    else:
+        pipeline.add_stage("generate", pick(generate_streaming, agenerate_streaming), ("prompt",), inline=inline)
+    return pipeline
+
+
+def run_pipeline(product_info: dict, n_hooks: int, base_instruction: str, collect_metrics: bool = None,
+                 run_index=None, **options) -> dict:
+    """
+    Runs the full hook-generation pipeline and returns the run_data record, with the seconds
+    spent in each stage (and time to first hook when streaming) under "stage_timings".
+    Unless collect_metrics is False (default: the metrics ENABLED setting), spans and counters are
+    recorded under "metrics" and exported as configured. Options are passed to build_pipeline.
+    With a `run_index` (see run_index.RunIndex), a close enough earlier run has its hooks served
+    without running the pipeline (unless bypass_cache is set) or its corpus and keywords reused;
+    run_data["semantic_cache"] then names the run, the similarity and the mode.
+    """
+    recorder = make_recorder(collect_metrics)
+    start = time.perf_counter()
+    with metrics.recording(recorder):
+        match, previous = semantic_match(run_index, product_info, n_hooks, base_instruction, options)
+        if match is not None and match[0] == "hooks":
+            run_data = cached_run_data(previous, product_info, n_hooks, options.get("on_hook"))
+        else:
+            results, timings = build_pipeline(
+                product_info, n_hooks, base_instruction, **reuse_options(match, previous, product_info, options)
+            ).run()
+            run_data = make_run_data(product_info, n_hooks, base_instruction, results, timings)
+    return finish_run(run_data, start, match, recorder, product_info)
+
+
+def make_recorder(collect_metrics: bool = None):
+    """
+    Returns a fresh Metrics for a run, or None when metrics are off (default: the ENABLED setting).
+    """
+    return metrics.Metrics() if (metrics.enabled() if collect_metrics is None else collect_metrics) else None
+
+
+def semantic_match(run_index, product_info: dict, n_hooks: int, base_instruction: str, options: dict) -> tuple:
+    """
+    Looks the product up in the run index. Returns ((mode, similarity, IndexedRun), earlier run_data),
+    or (None, None) when there is no usable match. Hooks are not served when bypass_cache asks for fresh ones.
+    """
+    if run_index is None:
+        return None, None
+    with metrics.span("semantic_cache"):
+        match = run_index.lookup(product_info, base_instruction, n_hooks,
+                                 serve_hooks=not options.get("bypass_cache"))
+        if match is None:
+            return None, None
+        previous = run_index.load_run(match[2])
+    if previous is None or not previous.get("reddit_subreddits_used"):
+        return None, None
+    return match, previous
+
+
+def reuse_options(match, previous: dict, product_info: dict, options: dict) -> dict:
+    """
+    Returns the build_pipeline options, reusing the matched earlier run's corpus if there is one, and its
+    keywords too when it was for the same product (keywords may name the product).
+    """
+    if match is None:
+        return options
+    same_product = product_name(previous["marketing_inputs"]) == product_name(product_info)
+    return {**options, "reuse": {
+        "subreddits": previous["discovered_subreddits"],
+        "posts_by_subreddit": previous["reddit_subreddits_used"],
+        "keywords": previous["refined_keywords"] if same_product else None,
+    }}
+
+
+def cached_run_data(previous: dict, product_info: dict, n_hooks: int, on_hook=None) -> dict:
+    """
+    Builds this run's record from an earlier run whose hooks are served as they are.
+    """
+    run_data = {key: value for key, value in previous.items() if key not in ("metrics", "semantic_cache")}
+    hooks = previous["generated_hooks"][:n_hooks]
+    if on_hook is not None:
+        for hook in hooks:
+            on_hook(hook)
+    run_data.update(marketing_inputs=product_info, n_hooks=n_hooks, generated_hooks=hooks, stage_timings={})
+    return run_data
+
+
+def finish_run(run_data: dict, start: float, match, recorder, product_info: dict) -> dict:
+    """
+    Adds the total time, the semantic cache match and the recorded metrics to run_data, and exports the metrics
+    (export errors are logged, not raised).
+    """
+    run_data["stage_timings"]["total"] = time.perf_counter() - start
+    logger.info("Stage timings: %s", {name: round(seconds, 3) for name, seconds in run_data["stage_timings"].items()})
+    if match is not None:
+        mode, similarity, run = match
+        run_data["semantic_cache"] = {"run_id": run.run_id, "similarity": round(similarity, 4), "mode": mode}
+        logger.info(f"Semantic cache: {mode} from run {run.run_id} (similarity {similarity:.3f})")
+    if recorder is not None:
+        run_data["metrics"] = recorder.as_dict()
+        try:
+            metrics.export(recorder, {"product": product_info.get("PRODUCT_NAME", "")})
+        except Exception:
+            # The hooks are already generated; a metrics file that cannot be written must not fail the run.
+            logger.exception("Exporting run metrics failed")
+    return run_data
+
+
+def make_run_data(product_info: dict, n_hooks: int, base_instruction: str, results: dict, timings: dict) -> dict:
+    """
+    Assembles the run_data record from the results of the pipeline stages.
+    """
+    if results["generate"].get("time_to_first_hook") is not None:
+        timings["time_to_first_hook"] = results["generate"]["time_to_first_hook"]
+    return {
+        "marketing_inputs": product_info,
+        "discovered_subreddits": results["discover"],
+        "reddit_subreddits_used": results["fetch"]["posts_by_subreddit"],
+        "refined_keywords": results["keywords"],
+        "sentiment": results["sentiment"]["mean"],
+        "sentiment_breakdown": {
+            "median": results["sentiment"]["median"],
+            "by_subreddit": results["sentiment"]["by_subreddit"],
+        },
+        "captured_reddit_examples": [example["text"] for example in results["examples"]],
+        "reddit_example_matches": results["examples"],
+        "hook_templates": HOOK_TEMPLATES,
+        "n_hooks": n_hooks,
+        "base_instruction": base_instruction,
+        # Fan-out runs never send the full prompt, so the prompts of their completions are recorded instead.
+        "constructed_prompt": results["generate"].get("prompts") or results["prompt"]["text"],
+        "prompt_tokens": results["prompt"]["token_counts"],
+        "generated_hooks": results["generate"]["hooks"],
+        "hook_fanout": results["generate"].get("fanout"),
+        "stage_timings": timings,
+    }
@@ -0,0 +1,74 @@
+"""
+Shared preprocessing of Reddit posts. Each post is processed once into a PostRecord, which the
+sentiment, hook-example and keyword stages read instead of re-normalizing and re-splitting the text.
+"""
+import hashlib
+import re
+from typing import Iterable, List
+
+# Length-preserving map of typographic punctuation to ASCII, so offsets into the normalized text
+# also index the original post.
+MATCH_REPLACEMENTS = (("\u2019", "'"), ("\u2018", "'"), ("\u201c", '"'), ("\u201d", '"'), ("\u2026", "."))
+SENTENCE = re.compile(r"[^.!?]+")
+
+
+def match_normalize(text: str) -> str:
+    """
+    Applies MATCH_REPLACEMENTS. ASCII text, the vast majority of posts, is returned as is; otherwise
+    chained str.replace calls beat str.translate, whose non-ASCII path looks up every character.
+    """
+    if text.isascii():
+        return text
+    for original, replacement in MATCH_REPLACEMENTS:
+        text = text.replace(original, replacement)
+    return text
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class PostRecord:
+    """
+    One preprocessed post: the original `text`, the length-preserving `normalized` text, its
+    lowercase view `lower`, (start, end) `sentences` offsets into both, and a 16-byte content `hash`.
+    `lower` is None in the rare case lowercasing changes the length, so offsets would not line up.
+    """
+
+    __slots__ = ("text", "normalized", "lower", "sentences", "hash")
+
+    def __init__(self, text: str):
+        self.text = text
+        # Shares the original string when nothing needs replacing.
+        self.normalized = normalized = match_normalize(text)
+        lower = normalized.lower()
+        self.lower = lower if len(lower) == len(normalized) else None
+        self.sentences = tuple(match.span() for match in SENTENCE.finditer(normalized))
+        self.hash = content_hash(text)
+
+    def __repr__(self) -> str:
+        return f"PostRecord({self.text[:40]!r})"
+
+
+def as_record(post) -> PostRecord:
+    """
+    Returns the post itself if it is already a PostRecord, otherwise preprocesses it.
+    """
+    return post if isinstance(post, PostRecord) else PostRecord(post)
+
+
+def preprocess_posts(posts: Iterable[str]) -> List[PostRecord]:
+    return [as_record(post) for post in posts]
+
+
+def excerpt(records: Iterable[PostRecord], max_chars: int) -> str:
+    """
+    Returns the first max_chars characters of the posts joined by spaces, without joining the rest.
+    """
+    parts, length = [], 0
+    for record in records:
+        if length >= max_chars:
+            break
+        parts.append(record.text)
+        length += len(record.text) + 1
+    return " ".join(parts)[:max_chars]
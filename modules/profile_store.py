@@ -0,0 +1,169 @@
+"""
+Named profiles of saved inputs (per user, per product, ...), one JSON file each, safe to share
+between Streamlit sessions and worker processes. Writers hold an exclusive lock on the profile's
+lock file and replace the file atomically (write to a temporary file, fsync, rename), so readers
+never see a torn file and need no lock. Reads are served from an in-process cache that is only
+refreshed when the file's mtime, size or inode changes.
+
+Settings ([profiles] section or HOOKGEN_PROFILES_* variables):
+    DIRECTORY   where profile files live (default "profiles")
+"""
+import copy
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+from . import config
+
+DEFAULT_DIRECTORY = "profiles"
+MAX_FILENAME_LENGTH = 200
+
+
+def profile_filename(name: str) -> str:
+    """
+    Maps a profile name to a safe file name by percent-encoding every character but letters, digits
+    and "_.-~", e.g. "Jane Doe/FastingPro" -> "Jane%20Doe%2FFastingPro.json". The mapping is
+    reversible (see profile_name), so distinct names never share a file.
+    """
+    safe = quote(name.strip(), safe="")
+    if not safe:
+        raise ValueError(f"Invalid profile name: {name!r}")
+    filename = f"{safe}.json"
+    # Leave room for the ".lock" and temporary-file suffixes within the usual 255-byte limit.
+    if len(filename) > MAX_FILENAME_LENGTH:
+        raise ValueError(f"Profile name too long: {name!r}")
+    return filename
+
+
+def profile_name(filename: str) -> str:
+    """
+    Inverse of profile_filename.
+    """
+    return unquote(filename[:-len(".json")])
+
+
+@contextmanager
+def _locked(path: str):
+    """
+    Holds an exclusive lock on `path` (created if missing) across processes.
+    """
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def write_json_atomic(path: str, data) -> None:
+    """
+    Writes `data` as JSON to a temporary file next to `path`, flushes it to disk and renames it over `path`.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, temporary = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+class ProfileStore:
+    """
+    Profiles as JSON files in `directory`. load() returns a copy of the cached contents, so callers
+    may modify it freely.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, profile_filename(name))
+
+    def load(self, name: str):
+        """
+        Returns the profile's data, or None if there is no such profile. Only reads the file when it
+        changed since the last load in this process.
+        """
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._cache.pop(path, None)
+            return None
+        version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            cached = self._cache.get(path)
+        if cached is None or cached[0] != version:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = (version, json.load(f))
+            with self._lock:
+                self._cache[path] = cached
+        return copy.deepcopy(cached[1])
+
+    def save(self, name: str, data) -> None:
+        """
+        Atomically replaces the profile, serialized with other writers of the same profile.
+        """
+        path = self.path(name)
+        with _locked(path + ".lock"):
+            write_json_atomic(path, data)
+        with self._lock:
+            self._cache.pop(path, None)
+
+    def delete(self, name: str) -> bool:
+        path = self.path(name)
+        with _locked(path + ".lock"):
+            try:
+                os.remove(path)
+                removed = True
+            except FileNotFoundError:
+                removed = False
+        with self._lock:
+            self._cache.pop(path, None)
+        return removed
+
+    def names(self) -> list:
+        """
+        Returns the stored profiles' names, sorted.
+        """
+        return sorted(
+            profile_name(filename) for filename in os.listdir(self.directory) if filename.endswith(".json")
+        )
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store() -> ProfileStore:
+    """
+    Returns the process-wide profile store in the "profiles" DIRECTORY setting.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ProfileStore(config.get_section("profiles").get("DIRECTORY", DEFAULT_DIRECTORY))
+        return _default_store
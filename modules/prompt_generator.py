@@ -1,3 +1,6 @@
+import re
+from functools import lru_cache
+
 # Global constant for hook templates (merged generic and clickbaity examples)
 HOOK_TEMPLATES = [
     "If you _______, stop scrolling!",
@@ -94,46 +97,126 @@ HOOK_TEMPLATES = [
     "Most People Get This Wrong…"
 ]
 
-def construct_prompt(marketing_inputs: dict, refined_keywords: list, sentiment: dict,
-                     reddit_hook_examples: list, n_hooks: int, base_instruction: str) -> str:
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
     """
-    Constructs the final prompt for generating hooks using the provided product info, refined keywords,
-    sentiment data, Reddit examples, desired number of hooks, and a base prompt instruction.
+    Cheap local token estimate: one token per punctuation mark and per ~4 characters of each word,
+    which tracks BPE tokenizers closely enough for budgeting English prompts.
+    """
+    return sum((len(piece) + 3) // 4 for piece in _TOKEN_PATTERN.findall(text))
+
+@lru_cache(maxsize=32)
+def render_template_block(templates: tuple) -> str:
+    """
+    Renders (and memoizes) the hook-template section of the prompt.
+    """
+    lines = ["Hook Templates (Examples/Base Structures):"]
+    lines.extend(f"- {template}" for template in templates)
+    return "\n".join(lines) + "\n\n"
+
+# The full template block never changes, so it is rendered once at import.
+STATIC_TEMPLATE_BLOCK = render_template_block(tuple(HOOK_TEMPLATES))
+_TEMPLATE_TOKENS = {template: estimate_tokens(f"- {template}\n") for template in HOOK_TEMPLATES}
+
+def rank_templates(query_text: str, templates: list = HOOK_TEMPLATES) -> list:
+    """
+    Orders templates by how many of their words (four letters or longer) occur in the query text,
+    keeping the original order among equally relevant ones.
+    """
+    query_words = {word for word in _TOKEN_PATTERN.findall(query_text.lower()) if len(word) >= 4}
+    def overlap(template):
+        return len(query_words.intersection(_TOKEN_PATTERN.findall(template.lower())))
+    return sorted(templates, key=overlap, reverse=True)
+
+def _canonical_order(templates: list) -> list:
+    """
+    Sorts templates into HOOK_TEMPLATES order (unknown ones last), so the rendered block stays a
+    stable, cacheable prefix whatever order they were selected in.
+    """
+    order = {template: i for i, template in enumerate(HOOK_TEMPLATES)}
+    return sorted(templates, key=lambda t: order.get(t, len(order)))
+
+def _select_templates(ranked: list, budget: int) -> list:
+    selected, used = [], estimate_tokens(render_template_block(()))
+    for template in ranked:
+        cost = _TEMPLATE_TOKENS.get(template) or estimate_tokens(f"- {template}\n")
+        if used + cost > budget:
+            break
+        selected.append(template)
+        used += cost
+    return _canonical_order(selected)
+
+def build_prompt(marketing_inputs: dict, refined_keywords: list, sentiment: dict,
+                 reddit_hook_examples: list, n_hooks: int, base_instruction: str,
+                 max_tokens: int = None, templates: list = None) -> tuple:
     """
-    prompt = base_instruction + "\n\n"
-    
+    Builds the hook prompt and returns (prompt, token_counts). Static content (base instruction and
+    hook templates) comes first so provider-side prompt caching can reuse the prefix across requests.
+    `templates` overrides the template list and is taken to be ordered by relevance (e.g. from
+    template_index); without it, templates are ranked by word overlap with the product and keywords.
+    When the prompt would exceed `max_tokens`, only the most relevant templates that fit are kept.
+    Either way the templates are rendered in HOOK_TEMPLATES order.
+    token_counts holds the estimated tokens per section plus "total" and "n_templates".
+    """
+    sections = {"base_instruction": base_instruction + "\n\n"}
+
+    product_lines = []
     if marketing_inputs:
-        prompt += "Product/Service Information:\n"
-        for key, value in marketing_inputs.items():
-            prompt += f"- {key}: {value}\n"
-        prompt += "\n"
-    
-    prompt += "Refined Keywords:\n"
-    prompt += f"- {', '.join(refined_keywords)}\n\n"
-    
-    prompt += "Reddit Insights (Sentiment):\n"
-    prompt += f"- Overall Sentiment: {sentiment}\n\n"
-    
+        product_lines.append("Product/Service Information:")
+        product_lines.extend(f"- {key}: {value}" for key, value in marketing_inputs.items())
+        product_lines.append("\n")
+    dynamic = {"product_info": "\n".join(product_lines)}
+
+    dynamic["refined_keywords"] = f"Refined Keywords:\n- {', '.join(refined_keywords)}\n\n"
+
+    sentiment_summary = ", ".join(f"{key} {value:.2f}" for key, value in sentiment.items())
     if sentiment.get("compound", 0) < 0.3:
-        prompt += "Note: The overall sentiment from Reddit is slightly negative. Emphasize a hopeful, transformative tone in the hooks.\n\n"
+        tone_note = "Note: The overall sentiment from Reddit is slightly negative. Emphasize a hopeful, transformative tone in the hooks."
     else:
-        prompt += "Note: The overall sentiment from Reddit is positive. Emphasize an upbeat, energizing tone in the hooks.\n\n"
-    
-    prompt += "Hook Templates (Examples/Base Structures):\n"
-    for template in HOOK_TEMPLATES:
-        prompt += f"- {template}\n"
-    prompt += "\n"
-    
-    prompt += "Examples of hooks extracted from Reddit:\n"
-    if reddit_hook_examples:
-        for example in reddit_hook_examples:
-            prompt += f"- {example}\n"
+        tone_note = "Note: The overall sentiment from Reddit is positive. Emphasize an upbeat, energizing tone in the hooks."
+    dynamic["sentiment"] = f"Reddit Insights (Sentiment):\n- Overall Sentiment: {sentiment_summary}\n\n{tone_note}\n\n"
+
+    example_lines = ["Examples of hooks extracted from Reddit:"]
+    example_lines.extend(f"- {example}" for example in reddit_hook_examples or ["No examples available."])
+    dynamic["reddit_examples"] = "\n".join(example_lines) + "\n\n"
+
+    dynamic["instructions"] = (
+        f"Using the information above, generate {n_hooks} creative and engaging hooks. "
+        "Each hook should combine elements from the hook templates with language inspired by the product and Reddit. "
+        "Provide each hook on a separate line."
+    )
+
+    counts = {name: estimate_tokens(text) for name, text in {**sections, **dynamic}.items()}
+    if templates is None:
+        selected, template_block = HOOK_TEMPLATES, STATIC_TEMPLATE_BLOCK
     else:
-        prompt += "- No examples available.\n"
-    prompt += "\n"
-    
-    prompt += f"Using the information above, generate {n_hooks} creative and engaging hooks. "
-    prompt += "Each hook should combine elements from the hook templates with language inspired by the product and Reddit. "
-    prompt += "Provide each hook on a separate line."
-    
-    return prompt
+        selected = _canonical_order(templates)
+        template_block = render_template_block(tuple(selected))
+    template_tokens = estimate_tokens(template_block)
+    if max_tokens is not None and sum(counts.values()) + template_tokens > max_tokens:
+        if templates is None:
+            query = " ".join([*map(str, (marketing_inputs or {}).values()), *refined_keywords])
+            ranked = rank_templates(query, selected)
+        else:
+            ranked = list(templates)
+        selected = _select_templates(ranked, max_tokens - sum(counts.values()))
+        template_block = render_template_block(tuple(selected))
+        template_tokens = estimate_tokens(template_block)
+    sections["hook_templates"] = template_block
+    counts["hook_templates"] = template_tokens
+    counts["total"] = sum(counts.values())
+    counts["n_templates"] = len(selected)
+
+    return "".join([*sections.values(), *dynamic.values()]), counts
+
+def construct_prompt(marketing_inputs: dict, refined_keywords: list, sentiment: dict,
+                     reddit_hook_examples: list, n_hooks: int, base_instruction: str,
+                     max_tokens: int = None, templates: list = None) -> str:
+    """
+    Constructs the final prompt for generating hooks using the provided product info, refined keywords,
+    sentiment data, Reddit examples, desired number of hooks, and a base prompt instruction.
+    See build_prompt for the token budget and template selection.
+    """
+    return build_prompt(marketing_inputs, refined_keywords, sentiment, reddit_hook_examples,
+                        n_hooks, base_instruction, max_tokens=max_tokens, templates=templates)[0]
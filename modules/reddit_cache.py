@@ -0,0 +1,164 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from . import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join("cache", "reddit_cache.sqlite3")
+DEFAULT_TTL = 3600
+DEFAULT_MAX_AGE = 86400
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    subreddit TEXT NOT NULL,
+    listing TEXT NOT NULL,
+    post_limit INTEGER NOT NULL,
+    posts TEXT NOT NULL,
+    newest TEXT,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    refreshed_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (subreddit, listing, post_limit)
+);
+CREATE INDEX IF NOT EXISTS listings_accessed_at ON listings (accessed_at);
+"""
+
+
+class CachedListing:
+    """
+    A cached listing: `posts` is a list of (fullname, text) pairs in listing order, `newest` the
+    fullname of the most recently created, non-stickied submission among them (the anchor of the
+    next incremental refresh).
+    `fresh` is False once the entry is older than the TTL and needs an incremental refresh;
+    `expired` is True once it is older than max_age and must be refetched in full.
+    """
+
+    def __init__(self, posts: list, newest: str, fresh: bool, expired: bool):
+        self.posts = posts
+        self.newest = newest
+        self.fresh = fresh
+        self.expired = expired
+
+    @property
+    def texts(self) -> list:
+        return [text for _, text in self.posts]
+
+
+class RedditCache:
+    """
+    SQLite-backed cache of subreddit listings keyed by (subreddit, listing, limit), with a TTL,
+    a hard max age and least-recently-used eviction once the stored posts exceed max_bytes.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 max_age: float = DEFAULT_MAX_AGE, max_bytes: int = DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max(max_age, ttl)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, subreddit: str, listing: str, limit: int):
+        """
+        Returns the CachedListing for the key, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT posts, newest, created_at, refreshed_at FROM listings "
+                "WHERE subreddit = ? AND listing = ? AND post_limit = ?",
+                (subreddit.lower(), listing, limit),
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            posts, newest, created_at, refreshed_at = row
+            fresh = now - refreshed_at < self.ttl
+            self.stats["hits" if fresh else "stale"] += 1
+            self._conn.execute(
+                "UPDATE listings SET accessed_at = ? WHERE subreddit = ? AND listing = ? AND post_limit = ?",
+                (now, subreddit.lower(), listing, limit),
+            )
+            self._conn.commit()
+        return CachedListing([tuple(p) for p in json.loads(posts)], newest, fresh, now - created_at >= self.max_age)
+
+    def put(self, subreddit: str, listing: str, limit: int, posts: list, newest: str = None,
+            refresh: bool = False) -> None:
+        """
+        Stores (fullname, text) pairs for the key, along with the fullname of the newest submission.
+        With refresh=True the original creation time is kept, so incrementally refreshed entries
+        still expire after max_age.
+        """
+        now = time.time()
+        payload = json.dumps(posts[:limit], ensure_ascii=False)
+        key = (subreddit.lower(), listing, limit)
+        with self._lock:
+            created_at = now
+            if refresh:
+                row = self._conn.execute(
+                    "SELECT created_at FROM listings WHERE subreddit = ? AND listing = ? AND post_limit = ?", key
+                ).fetchone()
+                if row is not None:
+                    created_at = row[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, payload, newest, len(payload.encode("utf-8")), created_at, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM listings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT subreddit, listing, post_limit, size_bytes FROM listings ORDER BY accessed_at"
+        ).fetchall()
+        for subreddit, listing, post_limit, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute(
+                "DELETE FROM listings WHERE subreddit = ? AND listing = ? AND post_limit = ?",
+                (subreddit, listing, post_limit),
+            )
+            total -= size
+            self.stats["evictions"] += 1
+        logger.info(f"Evicted Reddit cache entries, {total} bytes remain")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM listings")
+            self._conn.commit()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache() -> RedditCache:
+    """
+    Returns the process-wide Reddit cache, configured from the "reddit" settings on first use.
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            settings = config.get_section("reddit")
+            _default_cache = RedditCache(
+                path=settings.get("CACHE_PATH", DEFAULT_CACHE_PATH),
+                ttl=float(settings.get("CACHE_TTL", DEFAULT_TTL)),
+                max_age=float(settings.get("CACHE_MAX_AGE", DEFAULT_MAX_AGE)),
+                max_bytes=int(settings.get("CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+            )
+        return _default_cache
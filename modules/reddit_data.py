@@ -1,38 +1,567 @@
+import asyncio
 import logging
+import queue
 import re
-import praw
-from prawcore.exceptions import Forbidden, NotFound, Redirect
-import streamlit as st
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from . import config, metrics, resilience
+from .llm_client import acreate_response, create_response
 
 logger = logging.getLogger(__name__)
 
-def fetch_reddit_data(subreddits: list, limit: int = 30) -> dict:
-    reddit = praw.Reddit(
-        client_id=st.secrets["reddit"]["REDDIT_CLIENT_ID"],
-        client_secret=st.secrets["reddit"]["REDDIT_CLIENT_SECRET"],
-        user_agent=st.secrets["reddit"]["REDDIT_USER_AGENT"],
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+# Seconds fetch_reddit_data waits for all subreddits before going on with those it has.
+DEFAULT_DEADLINE = 30.0
+DEFAULT_LISTINGS = ("hot", "top", "new")
+DEFAULT_PAGE_SIZE = 25
+# Submissions per listing request when streaming (Reddit's maximum).
+LISTING_PAGE_SIZE = 100
+# Pages buffered between the fetch threads and the consumer of iter_reddit_posts.
+STREAM_QUEUE_PAGES = 16
+
+def _make_reddit(timeout: int = DEFAULT_TIMEOUT):
+    import praw
+    settings = config.get_section("reddit")
+    return praw.Reddit(
+        client_id=settings["REDDIT_CLIENT_ID"],
+        client_secret=settings["REDDIT_CLIENT_SECRET"],
+        user_agent=settings["REDDIT_USER_AGENT"],
+        timeout=int(timeout),
     )
-    
-    subreddit_posts = {}
-    for subreddit in subreddits:
+
+def get_policy() -> resilience.Policy:
+    """
+    Returns the resilience policy of Reddit listing requests: DEFAULT_MAX_RETRIES retries from a
+    DEFAULT_BACKOFF base unless the [resilience] settings say otherwise.
+    """
+    return resilience.get_policy("reddit", max_attempts=DEFAULT_MAX_RETRIES + 1, backoff=DEFAULT_BACKOFF)
+
+def _is_retryable(error) -> bool:
+    from prawcore.exceptions import RequestException, ServerError, TooManyRequests
+    return isinstance(error, (RequestException, ServerError, TooManyRequests))
+
+def _listing_posts(submissions: list) -> tuple:
+    """
+    Returns the (fullname, text) pairs of listed submissions and the fullname of the most recently
+    created one that is not stickied (hot listings start with pinned posts of any age), or None.
+    """
+    posts = [(submission.fullname, submission.title + " " + submission.selftext) for submission in submissions]
+    dated = [
+        (submission.created_utc, submission.fullname) for submission in submissions
+        if not getattr(submission, "stickied", False)
+    ]
+    return posts, max(dated)[1] if dated else None
+
+def _fetch_listing(reddit, subreddit: str, limit: int, listing: str = "hot", params: dict = None,
+                   policy: resilience.Policy = None, deadline: float = None) -> tuple:
+    """
+    Fetches one listing of a single subreddit as (posts, newest), see _listing_posts. Rate limits,
+    connection failures and server errors are retried with backoff (as long as Reddit's retry-after
+    header asks, when it does, but never past `deadline`) through the "reddit" circuit breaker.
+    """
+    def request():
+        logger.info(f"Fetching {listing} posts from subreddit: {subreddit}")
+        sub = reddit.subreddit(subreddit)
+        return _listing_posts(list(getattr(sub, listing)(limit=limit, params=params or {})))
+
+    # PRAW clients are bound to their thread, so listing requests are never hedged.
+    return resilience.call("reddit", request, _is_retryable, policy or get_policy(), hedge=False, deadline=deadline)
+
+def _fetch_subreddit(reddit, subreddit: str, limit: int, policy: resilience.Policy = None,
+                     deadline: float = None) -> list:
+    """
+    Fetches the hot posts of a single subreddit as (fullname, text) pairs.
+    """
+    return _fetch_listing(reddit, subreddit, limit, policy=policy, deadline=deadline)[0]
+
+def _merge_refresh(cache, subreddit: str, limit: int, cached, new_posts: list, newest: str) -> list:
+    """
+    Puts the submissions created since the cached entry's newest one in front of it and stores the
+    result. When there are none, the entry is left as it is, refresh time included, so the next
+    request checks again instead of serving the stale listing for another TTL.
+    """
+    if not new_posts:
+        return cached.posts
+    seen = {fullname for fullname, _ in new_posts}
+    posts = new_posts + [post for post in cached.posts if post[0] not in seen]
+    cache.put(subreddit, "hot", limit, posts, newest=newest or cached.newest, refresh=True)
+    return posts
+
+def _fetch_subreddit_cached(get_reddit, cache, subreddit: str, limit: int, deadline: float = None) -> list:
+    """
+    Serves a subreddit from the cache when fresh. Stale entries only pull the submissions of the
+    "new" listing created after the newest cached one and merge them in; expired or missing entries
+    are refetched.
+    """
+    cached = cache.get(subreddit, "hot", limit)
+    if cached is not None and cached.fresh:
+        metrics.incr("reddit_cache_hits")
+        return cached.texts
+    if cached is not None and not cached.expired and cached.newest:
+        metrics.incr("reddit_cache_refreshes")
+        new_posts, newest = _fetch_listing(
+            get_reddit(), subreddit, limit, "new", params={"before": cached.newest}, deadline=deadline
+        )
+        posts = _merge_refresh(cache, subreddit, limit, cached, new_posts, newest)
+    else:
+        metrics.incr("reddit_cache_misses")
+        posts, newest = _fetch_listing(get_reddit(), subreddit, limit, deadline=deadline)
+        cache.put(subreddit, "hot", limit, posts, newest=newest)
+    return [text for _, text in posts[:limit]]
+
+def iter_reddit_data(subreddits: list, limit: int = 30, max_workers: int = None, timeout: float = None,
+                     reddit_factory=None, cache=None, deadline: float = None):
+    """
+    Fetches the hot posts of every subreddit, using up to `max_workers` concurrent requests, and yields
+    (subreddit, posts) pairs in completion order so consumers can start on a subreddit while others download.
+    `timeout` bounds each subreddit's listing request; subreddits that are private, missing, keep
+    failing after retries or are rejected by the open "reddit" circuit are skipped, and so are those
+    still pending `deadline` seconds after the start (DEADLINE setting, default DEFAULT_DEADLINE; 0 waits
+    for all), so a few slow subreddits never hold up the run. `reddit_factory` builds one client per
+    worker thread (PRAW instances are not thread-safe). When a `reddit_cache.RedditCache` is given,
+    fresh listings are served without touching the network.
+    """
+    if max_workers is None:
+        max_workers = int(config.get_section("reddit").get("MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    if timeout is None:
+        timeout = float(config.get_section("reddit").get("TIMEOUT", DEFAULT_TIMEOUT))
+    if deadline is None:
+        deadline = float(config.get_section("reddit").get("DEADLINE", DEFAULT_DEADLINE))
+    expires = time.monotonic() + deadline if deadline else None
+    if reddit_factory is None:
+        reddit_factory = lambda: _make_reddit(timeout)
+    from prawcore.exceptions import Forbidden, NotFound, Redirect, RequestException, ServerError, TooManyRequests
+
+    local = threading.local()
+
+    def get_reddit():
+        if not hasattr(local, "reddit"):
+            local.reddit = reddit_factory()
+        return local.reddit
+
+    def fetch(subreddit):
         try:
-            logger.info(f"Fetching posts from subreddit: {subreddit}")
-            sub = reddit.subreddit(subreddit)
-            posts = []
-            for submission in sub.hot(limit=limit):
-                text = submission.title + " " + submission.selftext
-                posts.append(text)
-            subreddit_posts[subreddit] = posts
+            if cache is not None:
+                return _fetch_subreddit_cached(get_reddit, cache, subreddit, limit, expires)
+            return [text for _, text in _fetch_subreddit(get_reddit(), subreddit, limit, deadline=expires)]
         except (Forbidden, NotFound, Redirect) as e:
+            metrics.incr("reddit_skipped")
             logger.warning(f"Skipping subreddit '{subreddit}': {e}")
-    return subreddit_posts
+        except (TooManyRequests, RequestException, ServerError, resilience.CircuitOpenError) as e:
+            metrics.incr("reddit_skipped")
+            logger.warning(f"Skipping subreddit '{subreddit}' after request failure: {e}")
+        return None
 
-def discover_subreddits(product_info: dict, n: int = 10) -> list:
-    from openai import OpenAI
-    client = OpenAI(api_key=st.secrets["openai"]["OPENAI_API_KEY"])
-    model_name = st.secrets["openai"].get("MODEL_NAME", "gpt-4o")
-    temperature = float(st.secrets["openai"].get("TEMPERATURE", 0.7))
-    
+    def skip_expired(pending: list) -> None:
+        metrics.incr("reddit_skipped", len(pending))
+        metrics.incr("reddit_deadline_skipped", len(pending))
+        logger.warning(f"Fetch deadline of {deadline}s passed, going on without: {', '.join(pending)}")
+
+    workers = max(1, min(max_workers, len(subreddits)))
+    if workers == 1:
+        for i, subreddit in enumerate(subreddits):
+            if expires is not None and time.monotonic() >= expires:
+                skip_expired(subreddits[i:])
+                return
+            posts = fetch(subreddit)
+            if posts is not None:
+                yield subreddit, posts
+        return
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reddit-fetch")
+    try:
+        futures = {metrics.submit(executor, fetch, subreddit): subreddit for subreddit in subreddits}
+        done = set()
+        try:
+            for future in as_completed(futures, timeout=expires - time.monotonic() if expires else None):
+                done.add(future)
+                posts = future.result()
+                if posts is not None:
+                    yield futures[future], posts
+        except FutureTimeoutError:
+            skip_expired([subreddit for future, subreddit in futures.items() if future not in done])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _iter_listing(reddit, subreddit: str, listing: str, limit: int, comments: int, policy: resilience.Policy = None):
+    """
+    Yields (fullname, text) for the submissions of one listing, each followed by up to `comments`
+    of its top-level comments. The listing is requested one page of up to LISTING_PAGE_SIZE
+    submissions at a time, following Reddit's `after` cursor; every page and comment request goes
+    through the "reddit" resilience layer.
+    """
+    policy = policy or get_policy()
+    sub = reddit.subreddit(subreddit)
+    after, remaining = None, limit
+    while remaining > 0:
+        params = {"after": after} if after else {}
+        size = min(remaining, LISTING_PAGE_SIZE)
+
+        def request():
+            if listing == "top":
+                return list(sub.top(time_filter="month", limit=size, params=params))
+            return list(getattr(sub, listing)(limit=size, params=params))
+
+        page = resilience.call("reddit", request, _is_retryable, policy, hedge=False)
+        for submission in page:
+            yield submission.fullname, submission.title + " " + submission.selftext
+            if comments:
+                for comment in resilience.call(
+                    "reddit", lambda: _top_comments(submission, comments), _is_retryable, policy, hedge=False
+                ):
+                    yield comment.fullname, comment.body
+        if len(page) < size:
+            return
+        remaining -= len(page)
+        after = page[-1].fullname
+
+def _top_comments(submission, n: int) -> list:
+    submission.comment_sort = "top"
+    submission.comments.replace_more(limit=0)
+    return list(submission.comments)[:n]
+
+def iter_reddit_posts(subreddits: list, listings: tuple = DEFAULT_LISTINGS, limit: int = 100, comments: int = 0,
+                      max_posts: int = None, max_bytes: int = None, page_size: int = DEFAULT_PAGE_SIZE,
+                      max_workers: int = None, timeout: float = None, reddit_factory=None):
+    """
+    Streams posts from several listings of every subreddit and yields (subreddit, [texts]) pages of up
+    to `page_size` posts as they arrive. Each subreddit's listings are paged through in order (up to
+    `limit` submissions each, plus `comments` top-level comments per submission), skipping submissions
+    already seen in an earlier listing. Fetch threads stay at most STREAM_QUEUE_PAGES pages ahead of the
+    consumer, and the stream ends once `max_posts` posts or `max_bytes` characters have been yielded.
+    Closing the generator early stops the fetch threads. Listings are not cached.
+    """
+    if max_workers is None:
+        max_workers = int(config.get_section("reddit").get("MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    if timeout is None:
+        timeout = float(config.get_section("reddit").get("TIMEOUT", DEFAULT_TIMEOUT))
+    if reddit_factory is None:
+        reddit_factory = lambda: _make_reddit(timeout)
+    from prawcore.exceptions import Forbidden, NotFound, Redirect, RequestException, ServerError, TooManyRequests
+
+    local = threading.local()
+    stop = threading.Event()
+    pages = queue.Queue(maxsize=STREAM_QUEUE_PAGES)
+    done = object()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(subreddit):
+        try:
+            if not hasattr(local, "reddit"):
+                local.reddit = reddit_factory()
+            seen, page = set(), []
+            for listing in listings:
+                logger.info(f"Streaming {listing} posts from subreddit: {subreddit}")
+                for fullname, text in _iter_listing(local.reddit, subreddit, listing, limit, comments):
+                    if stop.is_set():
+                        return
+                    if fullname in seen:
+                        continue
+                    seen.add(fullname)
+                    page.append(text)
+                    if len(page) >= page_size:
+                        if not put((subreddit, page)):
+                            return
+                        page = []
+            if page:
+                put((subreddit, page))
+        except (Forbidden, NotFound, Redirect) as e:
+            metrics.incr("reddit_skipped")
+            logger.warning(f"Skipping subreddit '{subreddit}': {e}")
+        except (TooManyRequests, RequestException, ServerError, resilience.CircuitOpenError) as e:
+            metrics.incr("reddit_skipped")
+            logger.warning(f"Stopped streaming subreddit '{subreddit}' after request failure: {e}")
+        except Exception:
+            logger.exception(f"Streaming subreddit '{subreddit}' failed")
+        finally:
+            put(done)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(subreddits))),
+                                  thread_name_prefix="reddit-stream")
+    try:
+        for subreddit in subreddits:
+            metrics.submit(executor, produce, subreddit)
+        remaining, n_posts, n_bytes = len(subreddits), 0, 0
+        while remaining:
+            item = pages.get()
+            if item is done:
+                remaining -= 1
+                continue
+            subreddit, page = item
+            if max_posts is not None:
+                page = page[:max_posts - n_posts]
+            n_posts += len(page)
+            n_bytes += sum(len(text) for text in page)
+            yield subreddit, page
+            if (max_posts is not None and n_posts >= max_posts) or (max_bytes is not None and n_bytes >= max_bytes):
+                logger.info(f"Post stream reached its cap after {n_posts} posts")
+                return
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def fetch_reddit_data(subreddits: list, limit: int = 30, max_workers: int = None, timeout: float = None,
+                      reddit_factory=None, cache=None, deadline: float = None) -> dict:
+    """
+    Fetches the hot posts of every subreddit concurrently (see iter_reddit_data) and returns
+    {subreddit: [posts]} in the input order, leaving out subreddits that failed or missed the deadline.
+    """
+    fetched = dict(iter_reddit_data(subreddits, limit, max_workers, timeout, reddit_factory, cache, deadline))
+    return {subreddit: fetched[subreddit] for subreddit in subreddits if subreddit in fetched}
+
+def _make_async_reddit(timeout: int = DEFAULT_TIMEOUT):
+    """
+    Returns an asyncpraw.Reddit client, or None when asyncpraw is not installed.
+    """
+    try:
+        import asyncpraw
+    except ImportError:
+        return None
+    settings = config.get_section("reddit")
+    return asyncpraw.Reddit(
+        client_id=settings["REDDIT_CLIENT_ID"],
+        client_secret=settings["REDDIT_CLIENT_SECRET"],
+        user_agent=settings["REDDIT_USER_AGENT"],
+        timeout=int(timeout),
+    )
+
+def _ais_retryable(error) -> bool:
+    from asyncprawcore.exceptions import RequestException, ServerError, TooManyRequests
+    return isinstance(error, (RequestException, ServerError, TooManyRequests))
+
+async def _afetch_listing(reddit, subreddit: str, limit: int, listing: str = "hot", params: dict = None,
+                          policy: resilience.Policy = None) -> tuple:
+    """
+    asyncpraw counterpart of _fetch_listing.
+    """
+    async def request():
+        logger.info(f"Fetching {listing} posts from subreddit: {subreddit}")
+        sub = await reddit.subreddit(subreddit)
+        submissions = getattr(sub, listing)(limit=limit, params=params or {})
+        return _listing_posts([submission async for submission in submissions])
+
+    return await resilience.acall("reddit", request, _ais_retryable, policy or get_policy(), hedge=False)
+
+async def _afetch_subreddit(reddit, subreddit: str, limit: int, policy: resilience.Policy = None) -> list:
+    """
+    asyncpraw counterpart of _fetch_subreddit.
+    """
+    return (await _afetch_listing(reddit, subreddit, limit, policy=policy))[0]
+
+async def _afetch_subreddit_cached(reddit, cache, subreddit: str, limit: int) -> list:
+    """
+    asyncpraw counterpart of _fetch_subreddit_cached. Cache reads and writes run in a worker thread,
+    off the event loop.
+    """
+    cached = await asyncio.to_thread(cache.get, subreddit, "hot", limit)
+    if cached is not None and cached.fresh:
+        metrics.incr("reddit_cache_hits")
+        return cached.texts
+    if cached is not None and not cached.expired and cached.newest:
+        metrics.incr("reddit_cache_refreshes")
+        new_posts, newest = await _afetch_listing(reddit, subreddit, limit, "new", params={"before": cached.newest})
+        posts = await asyncio.to_thread(_merge_refresh, cache, subreddit, limit, cached, new_posts, newest)
+    else:
+        metrics.incr("reddit_cache_misses")
+        posts, newest = await _afetch_listing(reddit, subreddit, limit)
+        await asyncio.to_thread(cache.put, subreddit, "hot", limit, posts, newest=newest)
+    return [text for _, text in posts[:limit]]
+
+async def afetch_reddit_data(subreddits: list, limit: int = 30, max_workers: int = None, timeout: float = None,
+                             reddit_factory=None, cache=None, deadline: float = None) -> dict:
+    """
+    Async variant of fetch_reddit_data. With asyncpraw installed (and no `reddit_factory`), all subreddits
+    are fetched on the event loop, at most `max_workers` at a time, and those still pending at the
+    deadline are cancelled; otherwise the threaded fetch_reddit_data runs in a worker thread.
+    Returns {subreddit: [posts]} in the input order.
+    """
+    if not subreddits:
+        return {}
+    if max_workers is None:
+        max_workers = int(config.get_section("reddit").get("MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    if timeout is None:
+        timeout = float(config.get_section("reddit").get("TIMEOUT", DEFAULT_TIMEOUT))
+    if deadline is None:
+        deadline = float(config.get_section("reddit").get("DEADLINE", DEFAULT_DEADLINE))
+    reddit = _make_async_reddit(timeout) if reddit_factory is None else None
+    if reddit is None:
+        return await asyncio.to_thread(
+            fetch_reddit_data, subreddits, limit, max_workers, timeout, reddit_factory, cache, deadline
+        )
+    from asyncprawcore.exceptions import (
+        Forbidden, NotFound, Redirect, RequestException, ServerError, TooManyRequests
+    )
+
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def fetch(subreddit):
+        async with semaphore:
+            try:
+                if cache is not None:
+                    return await _afetch_subreddit_cached(reddit, cache, subreddit, limit)
+                return [text for _, text in await _afetch_subreddit(reddit, subreddit, limit)]
+            except (Forbidden, NotFound, Redirect) as e:
+                metrics.incr("reddit_skipped")
+                logger.warning(f"Skipping subreddit '{subreddit}': {e}")
+            except (TooManyRequests, RequestException, ServerError, resilience.CircuitOpenError) as e:
+                metrics.incr("reddit_skipped")
+                logger.warning(f"Skipping subreddit '{subreddit}' after request failure: {e}")
+            return None
+
+    async with reddit:
+        tasks = {subreddit: asyncio.ensure_future(fetch(subreddit)) for subreddit in subreddits}
+        _, pending = await asyncio.wait(tasks.values(), timeout=deadline or None)
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            expired = [subreddit for subreddit, task in tasks.items() if task in pending]
+            metrics.incr("reddit_skipped", len(expired))
+            metrics.incr("reddit_deadline_skipped", len(expired))
+            logger.warning(f"Fetch deadline of {deadline}s passed, going on without: {', '.join(expired)}")
+    return {
+        subreddit: task.result() for subreddit, task in tasks.items()
+        if task not in pending and task.result() is not None
+    }
+
+async def _aiter_listing(reddit, subreddit: str, listing: str, limit: int, comments: int,
+                         policy: resilience.Policy = None):
+    """
+    asyncpraw counterpart of _iter_listing.
+    """
+    policy = policy or get_policy()
+    sub = await reddit.subreddit(subreddit)
+    after, remaining = None, limit
+    while remaining > 0:
+        params = {"after": after} if after else {}
+        size = min(remaining, LISTING_PAGE_SIZE)
+
+        async def request():
+            if listing == "top":
+                submissions = sub.top(time_filter="month", limit=size, params=params)
+            else:
+                submissions = getattr(sub, listing)(limit=size, params=params)
+            return [submission async for submission in submissions]
+
+        page = await resilience.acall("reddit", request, _ais_retryable, policy, hedge=False)
+        for submission in page:
+            yield submission.fullname, submission.title + " " + submission.selftext
+            if comments:
+                for comment in await resilience.acall(
+                    "reddit", lambda: _atop_comments(submission, comments), _ais_retryable, policy, hedge=False
+                ):
+                    yield comment.fullname, comment.body
+        if len(page) < size:
+            return
+        remaining -= len(page)
+        after = page[-1].fullname
+
+async def _atop_comments(submission, n: int) -> list:
+    submission.comment_sort = "top"
+    await submission.load()
+    await submission.comments.replace_more(limit=0)
+    return [comment async for comment in submission.comments][:n]
+
+async def aiter_reddit_posts(subreddits: list, listings: tuple = DEFAULT_LISTINGS, limit: int = 100,
+                             comments: int = 0, max_posts: int = None, max_bytes: int = None,
+                             page_size: int = DEFAULT_PAGE_SIZE, max_workers: int = None, timeout: float = None,
+                             reddit_factory=None):
+    """
+    Async variant of iter_reddit_posts. With asyncpraw installed (and no `reddit_factory`), every subreddit
+    is streamed by a task on the event loop, at most `max_workers` at a time and at most STREAM_QUEUE_PAGES
+    pages ahead of the consumer; closing the generator cancels the tasks. Otherwise the pages of the
+    threaded iter_reddit_posts are handed over from a worker thread one at a time.
+    """
+    if max_workers is None:
+        max_workers = int(config.get_section("reddit").get("MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    if timeout is None:
+        timeout = float(config.get_section("reddit").get("TIMEOUT", DEFAULT_TIMEOUT))
+    reddit = _make_async_reddit(timeout) if reddit_factory is None else None
+    if reddit is None:
+        stream = iter_reddit_posts(subreddits, listings, limit, comments, max_posts, max_bytes, page_size,
+                                   max_workers, timeout, reddit_factory)
+        try:
+            while (item := await asyncio.to_thread(next, stream, None)) is not None:
+                yield item
+        finally:
+            try:
+                stream.close()
+            except ValueError:
+                # Cancelled while a page was being fetched: the generator closes once that step
+                # returns and the last reference to it is dropped.
+                pass
+        return
+    from asyncprawcore.exceptions import (
+        Forbidden, NotFound, Redirect, RequestException, ServerError, TooManyRequests
+    )
+
+    semaphore = asyncio.Semaphore(max_workers)
+    pages = asyncio.Queue(maxsize=STREAM_QUEUE_PAGES)
+    done = object()
+
+    async def produce(subreddit):
+        try:
+            async with semaphore:
+                seen, page = set(), []
+                for listing in listings:
+                    logger.info(f"Streaming {listing} posts from subreddit: {subreddit}")
+                    async for fullname, text in _aiter_listing(reddit, subreddit, listing, limit, comments):
+                        if fullname in seen:
+                            continue
+                        seen.add(fullname)
+                        page.append(text)
+                        if len(page) >= page_size:
+                            await pages.put((subreddit, page))
+                            page = []
+                if page:
+                    await pages.put((subreddit, page))
+        except (Forbidden, NotFound, Redirect) as e:
+            metrics.incr("reddit_skipped")
+            logger.warning(f"Skipping subreddit '{subreddit}': {e}")
+        except (TooManyRequests, RequestException, ServerError, resilience.CircuitOpenError) as e:
+            metrics.incr("reddit_skipped")
+            logger.warning(f"Stopped streaming subreddit '{subreddit}' after request failure: {e}")
+        except Exception:
+            logger.exception(f"Streaming subreddit '{subreddit}' failed")
+        await pages.put(done)
+
+    async with reddit:
+        tasks = [asyncio.ensure_future(produce(subreddit)) for subreddit in subreddits]
+        try:
+            remaining, n_posts, n_bytes = len(subreddits), 0, 0
+            while remaining:
+                item = await pages.get()
+                if item is done:
+                    remaining -= 1
+                    continue
+                subreddit, page = item
+                if max_posts is not None:
+                    page = page[:max_posts - n_posts]
+                n_posts += len(page)
+                n_bytes += sum(len(text) for text in page)
+                yield subreddit, page
+                if (max_posts is not None and n_posts >= max_posts) or (max_bytes is not None and n_bytes >= max_bytes):
+                    logger.info(f"Post stream reached its cap after {n_posts} posts")
+                    return
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def _discover_prompt(product_info: dict) -> str:
     prompt = (
         "You are an expert in social media and online communities. Based on the following product information, "
         "list 10 relevant subreddit names (only the names, separated by commas or as a numbered list) where people discuss "
@@ -40,13 +569,9 @@ def discover_subreddits(product_info: dict, n: int = 10) -> list:
     )
     for key, value in product_info.items():
         prompt += f"- {key}: {value}\n"
-    
-    response = client.responses.create(
-        model=model_name,
-        input=[{"role": "user", "content": prompt}],
-        temperature=temperature
-    )
-    output = response.output_text
+    return prompt
+
+def _parse_subreddits(output, n: int) -> list:
     if isinstance(output, list):
         raw = output[0].get("content", "")
     elif isinstance(output, str):
@@ -56,3 +581,13 @@ def discover_subreddits(product_info: dict, n: int = 10) -> list:
     
     subreddits = re.findall(r'(?:\d+\.\s*)?([a-zA-Z0-9_]+)', raw)
     return subreddits[:n]
+
+def discover_subreddits(product_info: dict, n: int = 10, bypass_cache: bool = False) -> list:
+    output = create_response([{"role": "user", "content": _discover_prompt(product_info)}], bypass_cache=bypass_cache)
+    return _parse_subreddits(output, n)
+
+async def adiscover_subreddits(product_info: dict, n: int = 10, bypass_cache: bool = False) -> list:
+    output = await acreate_response(
+        [{"role": "user", "content": _discover_prompt(product_info)}], bypass_cache=bypass_cache
+    )
+    return _parse_subreddits(output, n)
@@ -0,0 +1,329 @@
+"""
+Shared resilience layer for calls to external endpoints ("openai", "reddit"): retries with
+exponential backoff and full jitter (honouring Retry-After up to the backoff cap), optional hedged requests that race a
+duplicate against a slow call, and a circuit breaker per endpoint that fails calls fast while the
+endpoint keeps failing. Callers decide which errors are worth retrying; anything else is raised
+at once and does not count against the endpoint's health.
+
+Every retry, hedge and rejection is counted per endpoint for the whole process (stats()) and in
+the current run's metrics as <endpoint>_<event>.
+
+Settings ([resilience] section or HOOKGEN_RESILIENCE_* variables), each optionally prefixed with the
+endpoint to override it there only (e.g. OPENAI_HEDGE_AFTER):
+    MAX_ATTEMPTS       attempts per call, the first included
+    BACKOFF            base backoff in seconds, doubled per retry
+    MAX_BACKOFF        cap on a single backoff
+    HEDGE_AFTER        seconds after which a hedged duplicate request is sent (0 disables hedging)
+    FAILURE_THRESHOLD  consecutive failures that open an endpoint's circuit
+    RESET_TIMEOUT      seconds an open circuit rejects calls before letting a probe through
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICY = {
+    "max_attempts": 3,
+    "backoff": 0.5,
+    "max_backoff": 8.0,
+    "hedge_after": 0.0,
+    "failure_threshold": 5,
+    "reset_timeout": 30.0,
+}
+HEDGE_WORKERS = 32
+_COUNTERS = ("calls", "successes", "failures", "retries", "hedges", "hedge_wins", "rejected", "opened")
+
+_lock = threading.Lock()
+_breakers = {}
+_stats = {}
+_hedge_executor = None
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling an endpoint whose circuit is open.
+    """
+
+
+class Policy:
+    """
+    Retry, hedging and circuit-breaker settings of one endpoint.
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff: float = 0.5, max_backoff: float = 8.0,
+                 hedge_after: float = 0.0, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.hedge_after = float(hedge_after)
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = float(reset_timeout)
+
+    def delay(self, attempt: int) -> float:
+        """
+        Full-jitter backoff before retry number `attempt` (0-based).
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+
+def get_policy(endpoint: str, **defaults) -> Policy:
+    """
+    Returns the endpoint's Policy: DEFAULT_POLICY, then the caller's `defaults`, then the [resilience]
+    settings, then the endpoint-prefixed settings, in increasing precedence.
+    """
+    settings = config.get_section("resilience")
+    values = {**DEFAULT_POLICY, **defaults}
+    for key in DEFAULT_POLICY:
+        for name in (key.upper(), f"{endpoint.upper()}_{key.upper()}"):
+            if name in settings:
+                values[key] = settings[name]
+    return Policy(**values)
+
+
+class CircuitBreaker:
+    """
+    Closed while calls succeed. After `failure_threshold` consecutive failures it opens and rejects
+    calls for `reset_timeout` seconds, then lets a single probe through (half-open): the probe's
+    success closes the circuit again, its failure reopens it.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open":
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                opened = True
+            else:
+                opened = False
+        if opened:
+            _count(self.endpoint, "opened")
+            logger.warning(f"Circuit for '{self.endpoint}' opened after {self.failures} consecutive failures")
+
+
+def get_breaker(endpoint: str, policy: Policy = None) -> CircuitBreaker:
+    """
+    Returns the process-wide circuit breaker of an endpoint, created with `policy`'s thresholds.
+    """
+    with _lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            policy = policy or get_policy(endpoint)
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint, policy.failure_threshold, policy.reset_timeout)
+        return breaker
+
+
+def _count(endpoint: str, event: str, value: int = 1) -> None:
+    with _lock:
+        counters = _stats.setdefault(endpoint, dict.fromkeys(_COUNTERS, 0))
+        counters[event] += value
+    metrics.incr(f"{endpoint}_{event}", value)
+
+
+def stats() -> dict:
+    """
+    Returns the process-wide counters and circuit state of every endpoint called so far.
+    """
+    with _lock:
+        result = {endpoint: dict(counters) for endpoint, counters in _stats.items()}
+        for endpoint, breaker in _breakers.items():
+            result.setdefault(endpoint, dict.fromkeys(_COUNTERS, 0))["state"] = breaker.state
+        return result
+
+
+def reset() -> None:
+    """
+    Forgets all counters and circuit breakers, e.g. after changing the resilience settings.
+    """
+    with _lock:
+        _breakers.clear()
+        _stats.clear()
+
+
+def _retry_after(error):
+    """
+    Seconds the endpoint asked us to wait (prawcore's retry_after or a Retry-After header), or None.
+    """
+    value = getattr(error, "retry_after", None)
+    if value is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="hedge")
+        return _hedge_executor
+
+
+def _hedged(endpoint: str, func, hedge_after: float):
+    """
+    Runs func on the hedge pool; if it has not finished after hedge_after seconds, starts a duplicate
+    and returns whichever succeeds first. The slower request cannot be interrupted and runs to completion.
+    """
+    executor = _get_hedge_executor()
+    first = metrics.submit(executor, func)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+    _count(endpoint, "hedges")
+    second = metrics.submit(executor, func)
+    pending, error = {first, second}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    _count(endpoint, "hedge_wins")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+async def _ahedged(endpoint: str, func, hedge_after: float):
+    """
+    Async variant of _hedged; the losing request is cancelled.
+    """
+    first = asyncio.ensure_future(func())
+    done, _ = await asyncio.wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+    _count(endpoint, "hedges")
+    second = asyncio.ensure_future(func())
+    pending, error = {first, second}, None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        _count(endpoint, "hedge_wins")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _before_attempt(endpoint: str, breaker: CircuitBreaker) -> None:
+    if not breaker.allow():
+        _count(endpoint, "rejected")
+        raise CircuitOpenError(f"Circuit for '{endpoint}' is open")
+    _count(endpoint, "calls")
+
+
+def _after_failure(endpoint: str, breaker: CircuitBreaker, policy: Policy, error, retryable, attempt: int,
+                   deadline: float = None):
+    """
+    Records a failed attempt and returns the seconds to wait before the next one: the endpoint's
+    Retry-After or the policy's backoff, capped at max_backoff and at the time left until `deadline`
+    (a time.monotonic() value). Raises when the error is not retryable, the attempts are used up or
+    the deadline has passed.
+    """
+    if not retryable(error):
+        # The endpoint answered, so its health is fine; the request itself was bad.
+        breaker.record_success()
+        raise error
+    breaker.record_failure()
+    _count(endpoint, "failures")
+    if attempt + 1 >= policy.max_attempts:
+        raise error
+    delay = _retry_after(error)
+    delay = policy.delay(attempt) if delay is None else min(delay, policy.max_backoff)
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise error
+        delay = min(delay, remaining)
+    _count(endpoint, "retries")
+    logger.warning(f"{endpoint} call failed ({error}), retrying in {delay:.2f}s")
+    return delay
+
+
+def call(endpoint: str, func, retryable, policy: Policy = None, hedge: bool = True, deadline: float = None):
+    """
+    Calls func() through the endpoint's circuit breaker, retrying errors for which retryable(error) is
+    true. With hedge=True and a policy hedge_after, each attempt is hedged. No retry waits past
+    `deadline` (a time.monotonic() value). Raises CircuitOpenError when the circuit is open, otherwise
+    the last error once the attempts or the time are used up.
+    """
+    policy = policy or get_policy(endpoint)
+    breaker = get_breaker(endpoint, policy)
+    attempt = 0
+    while True:
+        _before_attempt(endpoint, breaker)
+        try:
+            result = _hedged(endpoint, func, policy.hedge_after) if hedge and policy.hedge_after > 0 else func()
+        except Exception as error:
+            time.sleep(_after_failure(endpoint, breaker, policy, error, retryable, attempt, deadline))
+            attempt += 1
+            continue
+        breaker.record_success()
+        _count(endpoint, "successes")
+        return result
+
+
+async def acall(endpoint: str, func, retryable, policy: Policy = None, hedge: bool = True,
+                deadline: float = None):
+    """
+    Async variant of call: func is a coroutine function, awaited once per attempt.
+    """
+    policy = policy or get_policy(endpoint)
+    breaker = get_breaker(endpoint, policy)
+    attempt = 0
+    while True:
+        _before_attempt(endpoint, breaker)
+        try:
+            if hedge and policy.hedge_after > 0:
+                result = await _ahedged(endpoint, func, policy.hedge_after)
+            else:
+                result = await func()
+        except Exception as error:
+            await asyncio.sleep(_after_failure(endpoint, breaker, policy, error, retryable, attempt, deadline))
+            attempt += 1
+            continue
+        breaker.record_success()
+        _count(endpoint, "successes")
+        return result
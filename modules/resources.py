@@ -0,0 +1,57 @@
+"""
+NLTK data lookup. Resources are resolved on first use: the vendored modules/nltk_data directory
+is searched first, then NLTK's usual locations, and only then is a download attempted.
+
+To vendor the data for offline machines, run once with network access: python -m modules.resources
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data")
+
+# resource path -> nltk package name
+NLTK_RESOURCES = {
+    "sentiment/vader_lexicon.zip": "vader_lexicon",
+    "corpora/stopwords": "stopwords",
+}
+
+_lock = threading.Lock()
+_resolved = set()
+
+
+def ensure_nltk_resource(resource: str) -> None:
+    """
+    Makes sure an NLTK resource (a key of NLTK_RESOURCES) can be loaded, downloading it only when
+    neither the vendored directory nor NLTK's search path has it. Raises LookupError otherwise.
+    """
+    if resource in _resolved:
+        return
+    import nltk
+    with _lock:
+        if NLTK_DATA_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, NLTK_DATA_DIR)
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            logger.info(f"NLTK resource '{resource}' not found locally, downloading it")
+            nltk.download(NLTK_RESOURCES[resource], quiet=True)
+            nltk.data.find(resource)
+        _resolved.add(resource)
+
+
+def vendor_nltk_data(directory: str = NLTK_DATA_DIR) -> None:
+    """
+    Downloads every resource the app needs into `directory` so it can ship with the code.
+    """
+    import nltk
+    for package in NLTK_RESOURCES.values():
+        if not nltk.download(package, download_dir=directory, quiet=True):
+            raise RuntimeError(f"Could not download NLTK package '{package}'")
+    print(f"NLTK data vendored into {directory}")
+
+
+if __name__ == "__main__":
+    vendor_nltk_data()
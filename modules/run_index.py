@@ -0,0 +1,233 @@
+"""
+Semantic cache over past runs. Every stored run is indexed by a TF-IDF vector of its product
+information, so a new run can find the most similar earlier runs in a sparse matrix-vector product.
+A close enough match lets run_pipeline skip work:
+
+    similarity >= HOOK_THRESHOLD   the earlier run's hooks are served at once, without running the pipeline,
+                                   provided it was for the same PRODUCT_NAME
+    similarity >= REUSE_THRESHOLD  its Reddit corpus and keywords are reused; only the hooks are generated
+
+Hooks name the product they were written for, and a product name is a word or two among a whole
+product description, so similarity alone cannot tell a competitor with the same pitch apart. Served
+hooks therefore also require the product names to match (ignoring case and spacing).
+
+Only the product information is indexed: a lookup happens before the new run has keywords or hooks
+of its own, so indexing the earlier runs' keywords and hooks would only add terms the query can never
+share and lower the similarity of genuine repeats.
+
+Terms are hashed into a fixed feature space, so runs are added and evicted one at a time without
+refitting; document frequencies are kept up to date as they come and go. The index holds at most
+MAX_RUNS runs and evicts the least recently matched or added one. The posts themselves stay in the
+run store and are only loaded when a corpus is reused.
+
+Settings ([semantic_cache] section or HOOKGEN_SEMANTIC_CACHE_* variables): ENABLED (default true),
+HOOK_THRESHOLD, REUSE_THRESHOLD and MAX_RUNS.
+"""
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from . import config, metrics, run_store
+
+logger = logging.getLogger(__name__)
+
+N_FEATURES = 2 ** 18
+DEFAULT_MAX_RUNS = 500
+DEFAULT_HOOK_THRESHOLD = 0.95
+DEFAULT_REUSE_THRESHOLD = 0.8
+
+
+def product_text(product_info: dict) -> str:
+    return " ".join(str(value) for value in (product_info or {}).values())
+
+
+def product_name(product_info: dict) -> str:
+    """
+    The product's PRODUCT_NAME, lowercased with runs of whitespace collapsed, for identity checks.
+    """
+    return " ".join(str((product_info or {}).get("PRODUCT_NAME", "")).lower().split())
+
+
+class IndexedRun:
+    """
+    What the index keeps of a run: its store id, product information, keywords, hooks, the number
+    of hooks asked for and the digest of its base instruction, plus its term counts.
+    """
+
+    __slots__ = ("run_id", "created_at", "product_info", "keywords", "hooks", "n_hooks", "instruction", "terms")
+
+    def __init__(self, run_id: int, created_at: float, record: dict, terms):
+        self.run_id = run_id
+        self.created_at = created_at
+        self.product_info = record.get("marketing_inputs") or {}
+        self.keywords = record.get("refined_keywords") or []
+        self.hooks = record.get("generated_hooks") or []
+        self.n_hooks = record.get("n_hooks")
+        instruction = record.get("base_instruction")
+        # Records read back from the store reference the base instruction by its blob digest.
+        self.instruction = instruction["$blob"] if isinstance(instruction, dict) else run_store.digest(instruction)
+        self.terms = terms
+
+
+class RunIndex:
+    """
+    Bounded TF-IDF index of past runs, safe to share between threads. `store` is the RunStore the
+    runs live in; it is needed to reuse a run's corpus.
+    """
+
+    def __init__(self, store=None, max_runs: int = DEFAULT_MAX_RUNS, hook_threshold: float = DEFAULT_HOOK_THRESHOLD,
+                 reuse_threshold: float = DEFAULT_REUSE_THRESHOLD):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        self.store = store
+        self.max_runs = max_runs
+        self.hook_threshold = hook_threshold
+        self.reuse_threshold = reuse_threshold
+        self.vectorizer = HashingVectorizer(
+            n_features=N_FEATURES, ngram_range=(1, 2), stop_words="english", strip_accents="unicode",
+            alternate_sign=False, norm=None,
+        )
+        self.stats = {"lookups": 0, "hits": 0, "evictions": 0}
+        self._runs = OrderedDict()
+        self._document_frequency = {}
+        self._matrix = None
+        self._ids = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    def _terms(self, product_info: dict):
+        terms = self.vectorizer.transform([product_text(product_info)])
+        terms.data = 1 + np.log(terms.data)
+        return terms
+
+    def add(self, run_id: int, created_at: float, record: dict) -> None:
+        """
+        Indexes a run_data record (or a record as returned by RunStore.records), evicting the least
+        recently used run when the index is full.
+        """
+        run = IndexedRun(run_id, created_at, record, self._terms(record.get("marketing_inputs")))
+        with self._lock:
+            if run_id in self._runs:
+                self._forget(self._runs.pop(run_id))
+            self._runs[run_id] = run
+            for feature in run.terms.indices:
+                self._document_frequency[feature] = self._document_frequency.get(feature, 0) + 1
+            while len(self._runs) > self.max_runs:
+                self._forget(self._runs.popitem(last=False)[1])
+                self.stats["evictions"] += 1
+            self._matrix = None
+
+    def _forget(self, run: IndexedRun) -> None:
+        for feature in run.terms.indices:
+            count = self._document_frequency[feature] - 1
+            if count:
+                self._document_frequency[feature] = count
+            else:
+                del self._document_frequency[feature]
+        self._matrix = None
+
+    def _weights(self, terms):
+        """
+        Applies the current smoothed IDF to term counts and L2-normalizes each row.
+        """
+        n = len(self._runs)
+        df = np.fromiter((self._document_frequency.get(feature, 0) for feature in terms.indices),
+                         dtype=float, count=len(terms.indices))
+        weighted = terms.copy()
+        weighted.data = weighted.data * (np.log((1 + n) / (1 + df)) + 1)
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return weighted.multiply(1 / norms[:, None]).tocsr()
+
+    def nearest(self, product_info: dict, k: int = 1) -> list:
+        """
+        Returns up to k (similarity, IndexedRun) pairs, most similar first.
+        """
+        query_terms = self._terms(product_info)
+        with self._lock:
+            if not self._runs:
+                return []
+            if self._matrix is None:
+                from scipy.sparse import vstack
+                self._ids = list(self._runs)
+                self._matrix = self._weights(vstack([self._runs[run_id].terms for run_id in self._ids]).tocsr())
+            scores = (self._matrix @ self._weights(query_terms).T).toarray().ravel()
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            return [(float(scores[i]), self._runs[self._ids[i]]) for i in sorted(top, key=lambda i: -scores[i])]
+
+    def lookup(self, product_info: dict, base_instruction: str = None, n_hooks: int = None,
+               serve_hooks: bool = True):
+        """
+        Returns (mode, similarity, IndexedRun) for the best match, mode being "hooks" when its hooks can
+        be served (serve_hooks, close enough, same product name and base instruction, at least n_hooks
+        hooks) or "reuse" when its corpus and keywords can; None when no run is similar enough.
+        Only a matched run counts as used for eviction.
+        """
+        matches = self.nearest(product_info)
+        hit = bool(matches) and matches[0][0] >= self.reuse_threshold
+        with self._lock:
+            self.stats["lookups"] += 1
+            self.stats["hits"] += hit
+            if hit and matches[0][1].run_id in self._runs:
+                self._runs.move_to_end(matches[0][1].run_id)
+        if not hit:
+            metrics.incr("semantic_cache_misses")
+            return None
+        similarity, run = matches[0]
+        mode = "reuse"
+        if (serve_hooks and similarity >= self.hook_threshold and len(run.hooks) >= (n_hooks or 0)
+                and product_name(product_info) == product_name(run.product_info)
+                and (base_instruction is None or run.instruction == run_store.digest(base_instruction))):
+            mode = "hooks"
+        metrics.incr(f"semantic_cache_{mode}")
+        return mode, similarity, run
+
+    def load_run(self, run: IndexedRun):
+        """
+        Returns the full run_data of an indexed run from the store, or None if it is gone.
+        """
+        if self.store is None:
+            return None
+        return self.store.get(run.run_id)
+
+    def load_from_store(self, store=None) -> int:
+        """
+        Indexes the newest max_runs runs of the store, oldest first, and returns how many were added.
+        """
+        store = store if store is not None else self.store
+        records = store.records(limit=self.max_runs)
+        for run_id, created_at, record in reversed(records):
+            self.add(run_id, created_at, record)
+        return len(records)
+
+
+def enabled() -> bool:
+    return str(config.get_section("semantic_cache").get("ENABLED", True)).lower() not in ("0", "false", "no")
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_index() -> RunIndex:
+    """
+    Returns the process-wide index over the default run store, loaded from it on first use and
+    kept up to date with every run written to it afterwards.
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            settings = config.get_section("semantic_cache")
+            store = run_store.get_store()
+            index = RunIndex(
+                store,
+                max_runs=int(settings.get("MAX_RUNS", DEFAULT_MAX_RUNS)),
+                hook_threshold=float(settings.get("HOOK_THRESHOLD", DEFAULT_HOOK_THRESHOLD)),
+                reuse_threshold=float(settings.get("REUSE_THRESHOLD", DEFAULT_REUSE_THRESHOLD)),
+            )
+            logger.info(f"Indexed {index.load_from_store()} past runs for the semantic cache")
+            store.add_listener(index.add)
+            _default_index = index
+        return _default_index
@@ -0,0 +1,387 @@
+"""
+Append-only store of run_data records in SQLite. Large values that repeat across runs (the hook
+templates, the base instruction) are stored once as zlib-compressed blobs keyed by content hash,
+and Reddit posts are stored once per post, so runs whose listings overlap share the posts they have
+in common. Run records reference both. Runs are indexed by product, creation time and subreddit.
+Migrated files are recorded by content hash, so migrating a directory again skips them.
+
+Migrate existing per-run JSON files with:
+    python -m modules.run_store migrate outputs/ [--store outputs/runs.sqlite3] [--delete]
+and look runs up with:
+    python -m modules.run_store find [--product NAME] [--subreddit NAME] [--since 2025-01-01]
+"""
+import argparse
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from . import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = os.path.join("outputs", "runs.sqlite3")
+# Top-level run_data fields stored as shared blobs; reddit_subreddits_used is stored per post.
+BLOB_FIELDS = ("hook_templates", "base_instruction")
+_BLOB_REF = "$blob"
+_POSTS_REF = "$posts"
+# Post hashes looked up per query, below SQLite's limit on bound parameters.
+_POSTS_PER_QUERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    product TEXT NOT NULL,
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_product ON runs (product, created_at);
+CREATE INDEX IF NOT EXISTS runs_created_at ON runs (created_at);
+CREATE TABLE IF NOT EXISTS run_subreddits (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    subreddit TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_subreddits_subreddit ON run_subreddits (subreddit, run_id);
+CREATE TABLE IF NOT EXISTS posts (
+    hash TEXT PRIMARY KEY,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS imports (
+    hash TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    imported_at REAL NOT NULL
+);
+"""
+
+
+def _compress(value) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _decompress(data: bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def _payload(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def digest(value) -> str:
+    """
+    Returns the content hash a value is stored under as a blob.
+    """
+    return hashlib.sha256(_payload(value)).hexdigest()
+
+
+def _blob(value, blobs: dict) -> dict:
+    payload = _payload(value)
+    key = hashlib.sha256(payload).hexdigest()
+    if key not in blobs:
+        blobs[key] = zlib.compress(payload)
+    return {_BLOB_REF: key}
+
+
+def _post_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _pack(run_data: dict) -> tuple:
+    """
+    Splits a run record into (record with references, {hash: compressed blob}, {hash: post text}).
+    """
+    blobs, posts = {}, {}
+    record = dict(run_data)
+    for field in BLOB_FIELDS:
+        if record.get(field) is not None:
+            record[field] = _blob(record[field], blobs)
+    if isinstance(record.get("reddit_subreddits_used"), dict):
+        references = {}
+        for subreddit, texts in record["reddit_subreddits_used"].items():
+            hashes = []
+            for text in texts:
+                key = _post_hash(text)
+                posts[key] = text
+                hashes.append(key)
+            references[subreddit] = {_POSTS_REF: hashes}
+        record["reddit_subreddits_used"] = references
+    return record, blobs, posts
+
+
+def _is_ref(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and _BLOB_REF in value
+
+
+def _is_posts_ref(value) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and _POSTS_REF in value
+
+
+class RunStore:
+    """
+    SQLite run store. append() hands records to a background writer thread so callers never wait
+    on disk; write() stores synchronously and returns the run id. Callbacks registered with
+    add_listener(callback) are called as callback(run_id, created_at, run_data) after every write.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._queue = queue.Queue()
+        self._writer = None
+        self._listeners = []
+
+    def add_listener(self, callback) -> None:
+        self._listeners.append(callback)
+
+    def append(self, run_data: dict, created_at: float = None) -> None:
+        """
+        Queues a run record for the background writer.
+        """
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_queued, name="run-store-writer", daemon=True)
+                self._writer.start()
+        self._queue.put((run_data, created_at if created_at is not None else time.time()))
+
+    def _write_queued(self) -> None:
+        while True:
+            run_data, created_at = self._queue.get()
+            try:
+                self.write(run_data, created_at)
+            except Exception:
+                logger.exception("Could not store run")
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """
+        Blocks until every queued record is written.
+        """
+        self._queue.join()
+
+    def write(self, run_data: dict, created_at: float = None, source: tuple = None) -> int:
+        """
+        Stores a run record and returns its id. `source` ((file name, content hash), see migrate) records
+        the file the run was imported from, in the same transaction.
+        """
+        record, blobs, posts = _pack(run_data)
+        product = (run_data.get("marketing_inputs") or {}).get("PRODUCT_NAME", "")
+        subreddits = {subreddit.lower() for subreddit in run_data.get("reddit_subreddits_used") or {}}
+        created_at = created_at if created_at is not None else time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR IGNORE INTO blobs VALUES (?, ?)", blobs.items())
+                self._conn.executemany("INSERT OR IGNORE INTO posts VALUES (?, ?)", posts.items())
+                run_id = self._conn.execute(
+                    "INSERT INTO runs (created_at, product, record) VALUES (?, ?, ?)",
+                    (created_at, product, _compress(record)),
+                ).lastrowid
+                self._conn.executemany(
+                    "INSERT INTO run_subreddits VALUES (?, ?)", [(run_id, subreddit) for subreddit in subreddits]
+                )
+                if source is not None:
+                    name, source_hash = source
+                    self._conn.execute(
+                        "INSERT INTO imports VALUES (?, ?, ?, ?)", (source_hash, name, run_id, time.time())
+                    )
+        for callback in self._listeners:
+            try:
+                callback(run_id, created_at, run_data)
+            except Exception:
+                logger.exception("Run store listener failed")
+        return run_id
+
+    def get(self, run_id: int):
+        """
+        Returns the full run_data record of a run, or None if there is no such run.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            record = _decompress(row[0])
+            blob_cache = {}
+
+            def resolve(value):
+                digest = value[_BLOB_REF]
+                if digest not in blob_cache:
+                    data = self._conn.execute("SELECT data FROM blobs WHERE hash = ?", (digest,)).fetchone()[0]
+                    blob_cache[digest] = _decompress(data)
+                return blob_cache[digest]
+
+            for field, value in record.items():
+                if _is_ref(value):
+                    record[field] = resolve(value)
+            if isinstance(record.get("reddit_subreddits_used"), dict):
+                used = record["reddit_subreddits_used"]
+                texts = self._post_texts(
+                    {key for value in used.values() if _is_posts_ref(value) for key in value[_POSTS_REF]}
+                )
+                # Stores written before posts were kept one by one reference a blob per subreddit.
+                record["reddit_subreddits_used"] = {
+                    subreddit: [texts[key] for key in value[_POSTS_REF]] if _is_posts_ref(value)
+                    else resolve(value) if _is_ref(value) else value
+                    for subreddit, value in used.items()
+                }
+        return record
+
+    def _post_texts(self, hashes: set) -> dict:
+        hashes, texts = list(hashes), {}
+        for start in range(0, len(hashes), _POSTS_PER_QUERY):
+            batch = hashes[start:start + _POSTS_PER_QUERY]
+            texts.update(self._conn.execute(
+                f"SELECT hash, text FROM posts WHERE hash IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return texts
+
+    def is_imported(self, source_hash: str) -> bool:
+        """
+        True if a file with this content hash was already imported by migrate.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM imports WHERE hash = ?", (source_hash,)).fetchone() is not None
+
+    def records(self, limit: int = 100) -> list:
+        """
+        Returns (id, created_at, record) of the newest runs, newest first. Shared values are left as
+        references (templates and base instruction as {"$blob": digest}, each subreddit's posts as
+        {"$posts": [hash, ...]}), so this stays cheap.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, created_at, record FROM runs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [(run_id, created_at, _decompress(record)) for run_id, created_at, record in rows]
+
+    def find(self, product: str = None, subreddit: str = None, since: float = None, until: float = None,
+             limit: int = 100) -> list:
+        """
+        Returns summaries ({"id", "created_at", "product"}) of matching runs, newest first.
+        """
+        query = "SELECT id, created_at, product FROM runs"
+        conditions, params = [], []
+        if subreddit is not None:
+            conditions.append("id IN (SELECT run_id FROM run_subreddits WHERE subreddit = ?)")
+            params.append(subreddit.lower())
+        if product is not None:
+            conditions.append("product = ?")
+            params.append(product)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created_at < ?")
+            params.append(until)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{"id": row[0], "created_at": row[1], "product": row[2]} for row in rows]
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def migrate(directory: str, store: RunStore, delete: bool = False) -> int:
+    """
+    Imports every run_*.json file in `directory` into the store, dated by the timestamp in its
+    name (or its modification time). Files whose content was imported before are skipped, so
+    migrating the same directory twice stores each run once. With delete=True, imported and
+    skipped files are removed. Returns the number of runs imported.
+    """
+    imported = 0
+    for path in sorted(glob.glob(os.path.join(directory, "run_*.json"))):
+        name = os.path.basename(path)
+        try:
+            created_at = datetime.strptime(name, "run_%Y%m%d_%H%M%S.json").timestamp()
+        except ValueError:
+            created_at = os.path.getmtime(path)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            source_hash = hashlib.sha256(content).hexdigest()
+            if store.is_imported(source_hash):
+                logger.info(f"Skipping {path}: already imported")
+            else:
+                store.write(json.loads(content.decode("utf-8")), created_at, source=(name, source_hash))
+                imported += 1
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping {path}: {e}")
+            continue
+        if delete:
+            os.remove(path)
+    return imported
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store() -> RunStore:
+    """
+    Returns the process-wide run store at the "outputs" STORE_PATH setting, flushed at exit.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = RunStore(config.get_section("outputs").get("STORE_PATH", DEFAULT_STORE_PATH))
+            atexit.register(_default_store.flush)
+        return _default_store
+
+
+def _parse_date(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the run store.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Run store database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="Import run_*.json files")
+    migrate_parser.add_argument("directory", nargs="?", default="outputs")
+    migrate_parser.add_argument("--delete", action="store_true", help="Remove files once imported")
+    find_parser = commands.add_parser("find", help="List stored runs")
+    find_parser.add_argument("--product")
+    find_parser.add_argument("--subreddit")
+    find_parser.add_argument("--since", type=_parse_date, help="ISO date or datetime")
+    find_parser.add_argument("--until", type=_parse_date, help="ISO date or datetime")
+    find_parser.add_argument("--limit", type=int, default=20)
+    show_parser = commands.add_parser("show", help="Print a stored run as JSON")
+    show_parser.add_argument("run_id", type=int)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    store = RunStore(args.store)
+    if args.command == "migrate":
+        print(f"Imported {migrate(args.directory, store, delete=args.delete)} runs into {args.store}")
+    elif args.command == "find":
+        for run in store.find(args.product, args.subreddit, args.since, args.until, args.limit):
+            created = datetime.fromtimestamp(run["created_at"]).isoformat(timespec="seconds")
+            print(f"{run['id']:>6}  {created}  {run['product']}")
+    else:
+        print(json.dumps(store.get(args.run_id), indent=4, ensure_ascii=False))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import numpy as np
+from .prompt_generator import HOOK_TEMPLATES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join("cache", "template_index.joblib")
+DEFAULT_WEIGHTS = {"product_info": 1.0, "keywords": 1.5, "reddit": 0.5}
+# Bump when TemplateIndex's attributes change, so persisted indexes are rebuilt.
+INDEX_VERSION = "1"
+
+_SLOT = re.compile(r"_{2,}|\[[^\]]*\]")
+
+
+class TemplateIndex:
+    """
+    TF-IDF index over hook templates. Queries are weighted sums of the product info, refined keywords
+    and Reddit text vectors, scored against every template in one matrix-vector product. The template
+    vocabulary is small, so queries are vectorized directly against it with a dense matrix instead of
+    going through the vectorizer's sparse transform.
+    """
+
+    def __init__(self, templates: list = HOOK_TEMPLATES):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self.templates = list(templates)
+        self.fingerprint = fingerprint(self.templates)
+        self.vectorizer = TfidfVectorizer(
+            ngram_range=(1, 2), sublinear_tf=True, stop_words="english", strip_accents="unicode"
+        )
+        # Slots such as [Topic] carry no meaning of their own, so they are not indexed.
+        self.matrix = self.vectorizer.fit_transform([_SLOT.sub(" ", t) for t in self.templates]).toarray()
+        self.vocabulary = self.vectorizer.vocabulary_
+        self.idf = self.vectorizer.idf_
+        self._analyzer = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_analyzer"] = None
+        return state
+
+    def _vectorize(self, text: str) -> np.ndarray:
+        if self._analyzer is None:
+            self._analyzer = self.vectorizer.build_analyzer()
+        counts = {}
+        for term in self._analyzer(text):
+            column = self.vocabulary.get(term)
+            if column is not None:
+                counts[column] = counts.get(column, 0) + 1
+        vector = np.zeros(len(self.idf))
+        if counts:
+            columns = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=float, count=len(counts))
+            vector[columns] = (1 + np.log(tf)) * self.idf[columns]
+            vector /= np.linalg.norm(vector)
+        return vector
+
+    def scores(self, product_info: dict = None, keywords: list = None, reddit_text: str = "",
+               weights: dict = None) -> np.ndarray:
+        """
+        Returns one cosine-similarity score per template for the combined query.
+        """
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        parts = {
+            "product_info": " ".join(str(v) for v in (product_info or {}).values()),
+            "keywords": " ".join(keywords or []),
+            "reddit": reddit_text or "",
+        }
+        query = np.zeros(len(self.idf))
+        for name, text in parts.items():
+            if text:
+                query += weights[name] * self._vectorize(text)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self.templates))
+        return self.matrix @ (query / norm)
+
+    def rank(self, product_info: dict = None, keywords: list = None, reddit_text: str = "",
+             weights: dict = None) -> list:
+        """
+        Returns every template, most relevant first; ties keep the templates' original order.
+        """
+        scores = self.scores(product_info, keywords, reddit_text, weights)
+        return [self.templates[i] for i in np.argsort(-scores, kind="stable")]
+
+    def top_k(self, k: int, product_info: dict = None, keywords: list = None, reddit_text: str = "",
+              weights: dict = None) -> list:
+        """
+        Returns the k most relevant templates, most relevant first.
+        """
+        scores = self.scores(product_info, keywords, reddit_text, weights)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k else []
+        return [self.templates[i] for i in sorted(top, key=lambda i: (-scores[i], i))]
+
+    def save(self, path: str = DEFAULT_INDEX_PATH) -> None:
+        import joblib
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        joblib.dump(self, path)
+
+
+def fingerprint(templates: list) -> str:
+    """
+    Identifies an index by its templates, the TemplateIndex layout and the scikit-learn version, so a
+    pickle from another version of either is rebuilt rather than trusted.
+    """
+    import sklearn
+    identity = [f"{TemplateIndex.__module__}.{TemplateIndex.__qualname__}", INDEX_VERSION, sklearn.__version__]
+    return hashlib.sha256("\n".join([*identity, *templates]).encode("utf-8")).hexdigest()
+
+
+def load_or_build(path: str = DEFAULT_INDEX_PATH, templates: list = HOOK_TEMPLATES) -> TemplateIndex:
+    """
+    Loads the persisted index when it was built from the same templates by the same TemplateIndex and
+    scikit-learn versions, otherwise builds and saves a new one.
+    """
+    import joblib
+    if os.path.exists(path):
+        try:
+            index = joblib.load(path)
+            if isinstance(index, TemplateIndex) and index.fingerprint == fingerprint(templates):
+                return index
+            logger.info("Hook templates or index version changed, rebuilding the template index")
+        except Exception as e:
+            logger.warning(f"Could not load template index from {path}: {e}")
+    index = TemplateIndex(templates)
+    index.save(path)
+    return index
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_index() -> TemplateIndex:
+    """
+    Returns the process-wide index over HOOK_TEMPLATES, loaded or built on first use.
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = load_or_build()
+        return _default_index
@@ -4,22 +4,26 @@ import json
 import unicodedata
 from datetime import datetime
 
+_NON_WORD = re.compile(r"\W+")
+_NORMALIZE_REPLACEMENTS = {
+    "\u2026": "...",
+    "\u2019": "'",
+    "\u2018": "'",
+    "\u2013": "-",
+    "\u2014": "-",
+    "\u201c": '"',
+    "\u201d": '"',
+}
+
 def clean_text(text: str) -> str:
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r"\W+", " ", text)
-    return text.lower().strip()
+    # Whitespace is itself a non-word character, so one substitution collapses both.
+    return _NON_WORD.sub(" ", text).lower().strip()
 
 def normalize_text(text: str) -> str:
-    replacements = {
-        "\u2026": "...",
-        "\u2019": "'",
-        "\u2018": "'",
-        "\u2013": "-",
-        "\u2014": "-",
-        "\u201c": '"',
-        "\u201d": '"',
-    }
-    for orig, repl in replacements.items():
+    # ASCII text has nothing to replace and is unchanged by NFKD.
+    if text.isascii():
+        return text
+    for orig, repl in _NORMALIZE_REPLACEMENTS.items():
         text = text.replace(orig, repl)
     normalized = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
     return normalized
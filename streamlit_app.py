@@ -1,23 +1,38 @@
 import os
 import re
-import json
 import logging
 import streamlit as st
-from modules import reddit_data, data_processing, prompt_generator, hook_generator, defaults
-from modules.prompt_generator import HOOK_TEMPLATES
-from modules.tools import save_output, normalize_text
+from modules import pipeline, reddit_cache, llm_cache, run_index, run_store, defaults
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 st.title("Hook Generator")
 
-# Load saved defaults from temp.json (or use built-in defaults if none exists)
-saved_defaults = defaults.load_defaults()
-if "product_info" not in st.session_state:
-    st.session_state["product_info"] = saved_defaults["product_info"].copy()
-if "base_instruction" not in st.session_state:
-    st.session_state["base_instruction"] = saved_defaults["base_instruction"]
+INPUT_KEYS = (
+    "product_name_input", "product_description_input", "target_audience_input", "key_benefits_input",
+    "brand_tone_input", "context_info_input", "base_instruction_input",
+)
+
+def apply_saved_inputs(saved: dict):
+    st.session_state["product_info"] = saved["product_info"].copy()
+    st.session_state["base_instruction"] = saved["base_instruction"]
+    # Dropping the widget state makes the inputs below start from the loaded values.
+    for key in INPUT_KEYS:
+        st.session_state.pop(key, None)
+
+# Load the saved inputs of the selected profile (or the built-in defaults) once per session and profile;
+# profiles are cached in-process, so reruns do not read the file unless it changed.
+st.sidebar.header("Profile")
+profile = st.sidebar.text_input(
+    "Defaults profile",
+    value=defaults.DEFAULT_PROFILE,
+    help="Saved inputs are kept per profile, e.g. one per user or product.",
+    key="profile_input"
+).strip() or defaults.DEFAULT_PROFILE
+if st.session_state.get("loaded_profile") != profile:
+    apply_saved_inputs(defaults.load_defaults(profile))
+    st.session_state["loaded_profile"] = profile
 
 # Sidebar: Input Parameters using session state
 st.sidebar.header("Product Information")
@@ -56,6 +71,17 @@ n_hooks_ui = st.sidebar.number_input(
     value=int(st.secrets["openai"].get("N_HOOKS", 3)), 
     key="n_hooks_input"
 )
+fresh_hooks = st.sidebar.checkbox(
+    "Fresh hooks (skip response cache)",
+    value=False,
+    key="fresh_hooks_input"
+)
+keyword_mode = st.sidebar.selectbox(
+    "Keyword extraction",
+    options=["llm", "hybrid", "local"],
+    index=["llm", "hybrid", "local"].index(st.secrets["openai"].get("KEYWORD_MODE", "llm")),
+    key="keyword_mode_input"
+)
 
 st.sidebar.header("Base Prompt Instruction")
 base_instruction = st.sidebar.text_area(
@@ -79,20 +105,14 @@ def update_session_state():
 update_session_state()
 
 if st.sidebar.button("Save Inputs as Defaults"):
-    current_defaults = {
-        "product_info": st.session_state["product_info"],
-        "base_instruction": st.session_state["base_instruction"]
-    }
-    with open("temp.json", "w", encoding="utf-8") as f:
-        json.dump(current_defaults, f, indent=4, ensure_ascii=False)
-    defaults.save_defaults(current_defaults["product_info"], current_defaults["base_instruction"])
-    st.sidebar.success("Inputs saved as defaults!")
+    defaults.save_defaults(st.session_state["product_info"], st.session_state["base_instruction"], profile)
+    st.sidebar.success(f"Inputs saved to profile '{profile}'!")
 
 if st.sidebar.button("Revert to Defaults"):
-    loaded = defaults.revert_to_defaults()  # Loads built-in defaults and updates temp.json
-    st.session_state["product_info"] = loaded["product_info"].copy()
-    st.session_state["base_instruction"] = loaded["base_instruction"]
-    if hasattr(st, "experimental_rerun"):
+    apply_saved_inputs(defaults.revert_to_defaults(profile))  # Also overwrites the profile
+    if hasattr(st, "rerun"):
+        st.rerun()
+    elif hasattr(st, "experimental_rerun"):
         st.experimental_rerun()
     else:
         st.sidebar.info("Reverted to defaults! Please refresh the page if inputs do not update.")
@@ -102,69 +122,45 @@ def get_marketing_inputs() -> dict:
 
 if st.button("Generate Hooks"):
     product_info = get_marketing_inputs()
+    status = st.empty()
+    hooks_container = st.container()
+    hooks_shown = []
+    
+    def show_hook(hook: str):
+        # Hooks are written as soon as each line of the completion streams in.
+        if not hooks_shown:
+            hooks_container.header("Generated Hooks")
+        hooks_shown.append(hook)
+        hooks_container.write(hook)
     
     with st.spinner("Generating hooks..."):
-        # 1. Discover subreddits using product info
-        discovered_subreddits = reddit_data.discover_subreddits(product_info, n=10)
-        logger.info("Discovered Subreddits: %s", discovered_subreddits)
-        
-        # 2. Fetch Reddit data from discovered subreddits
-        reddit_posts_by_subreddit = reddit_data.fetch_reddit_data(discovered_subreddits, limit=30)
-        
-        # 3. Aggregate all Reddit posts
-        all_reddit_posts = []
-        for posts in reddit_posts_by_subreddit.values():
-            all_reddit_posts.extend(posts)
-        aggregated_text = " ".join(all_reddit_posts)
-        
-        # 4. Perform sentiment analysis on aggregated posts
-        sentiment = data_processing.analyze_sentiment(all_reddit_posts)
-        
-        # 5. Extract hook-like examples from Reddit data
-        reddit_hook_examples = data_processing.extract_hook_examples(reddit_posts_by_subreddit, example_limit=3)
-        
-        # 6. Generate refined keywords based on product info and aggregated Reddit text
-        refined_keywords = hook_generator.generate_refined_keywords(product_info, aggregated_text)
-        
-        # 7. Get number of hooks from UI
-        n_hooks = n_hooks_ui
-        
-        # 8. Construct the final prompt using HOOK_TEMPLATES and the UI-edited base instruction
-        final_prompt = prompt_generator.construct_prompt(
+        # 1-10. Discover subreddits, fetch and analyze Reddit data, build the prompt and stream the hooks.
+        # Independent stages (sentiment, hook examples, keyword refinement) run concurrently.
+        run_data = pipeline.run_pipeline(
             product_info,
-            refined_keywords,
-            sentiment,
-            reddit_hook_examples,
-            n_hooks,
-            base_instruction=st.session_state["base_instruction"]
+            n_hooks_ui,
+            st.session_state["base_instruction"],
+            reddit_cache=reddit_cache.get_cache(),
+            bypass_cache=fresh_hooks,
+            keyword_mode=keyword_mode,
+            on_hook=show_hook,
+            run_index=run_index.get_index() if run_index.enabled() else None
         )
-        logger.info("Constructed Prompt:\n%s", final_prompt)
-        
-        # 9. Generate hooks using the OpenAI API
-        generated_hooks_raw = hook_generator.generate_hook(final_prompt)
-        logger.info("Raw Generated Hooks: %s", generated_hooks_raw)
+        logger.info("Discovered Subreddits: %s", run_data["discovered_subreddits"])
+        logger.info("Constructed Prompt:\n%s", run_data["constructed_prompt"])
+        logger.info("Reddit cache stats: %s", reddit_cache.get_cache().stats)
+        logger.info("LLM cache stats: %s", llm_cache.get_cache().stats)
+        if run_data.get("metrics"):
+            logger.info("Run metrics: %s", run_data["metrics"]["counters"])
         
-        # 10. Normalize and split the generated hooks into a list (one per line)
-        generated_hooks = [normalize_text(hook.strip()) for hook in generated_hooks_raw.splitlines() if hook.strip()]
-        
-        # 11. Save run data locally as JSON in the outputs folder
-        run_data = {
-            "marketing_inputs": product_info,
-            "discovered_subreddits": discovered_subreddits,
-            "reddit_subreddits_used": reddit_posts_by_subreddit,
-            "refined_keywords": refined_keywords,
-            "sentiment": sentiment,
-            "captured_reddit_examples": reddit_hook_examples,
-            "hook_templates": HOOK_TEMPLATES,
-            "n_hooks": n_hooks,
-            "base_instruction": st.session_state["base_instruction"],
-            "constructed_prompt": final_prompt,
-            "generated_hooks": generated_hooks,
-        }
-        save_output(run_data)
+        # 11. Save run data in the run store, unless its hooks were served from an earlier run
+        semantic_cache = run_data.get("semantic_cache")
+        if not semantic_cache or semantic_cache["mode"] != "hooks":
+            run_store.get_store().append(run_data)
         st.session_state["run_data"] = run_data  # Save for potential future use
     
-    st.success("Hooks generated successfully!")
-    st.header("Generated Hooks")
-    for hook in generated_hooks:
-        st.write(hook)
+    if semantic_cache and semantic_cache["mode"] == "hooks":
+        status.info(f"Served hooks from a similar earlier run (similarity {semantic_cache['similarity']:.2f}). "
+                    "Tick 'Fresh hooks' to generate new ones.")
+    else:
+        status.success("Hooks generated successfully!")